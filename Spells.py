@@ -1,25 +1,140 @@
 #!/usr/bin/env python3
-
+"""Compare which spells appear in which of several one spell per line files."""
+import argparse
+import csv
+import json
 import sys
-from collections import defaultdict
-from prettytable import PrettyTable
+from typing import Dict, Iterable, List, Optional, Tuple
 
-def main(args=None):
-    if args == None:
-        args = sys.argv
-    args = args[1:]
-    n = len(args) 
-    r = defaultdict(lambda : [""]*n)
-    for i,name in enumerate(args):
+
+def normalize(line: str) -> str:
+    return line.strip().casefold()
+
+
+def read_membership(files: List[str]) -> Tuple[Dict[str, int], Dict[str, str]]:
+    """
+    Read the files a line at a time, returning a bitmask per spell with bit i set if it is in files[i].
+
+    Spells are keyed by their stripped, case folded line and also mapped to the first
+    spelling seen for display. Blank lines are skipped.
+    """
+    masks: Dict[str, int] = {}
+    names: Dict[str, str] = {}
+    for i, name in enumerate(files):
+        bit = 1 << i
         with open(name) as f:
             for line in f:
-                r[line][i] = "X"
-    t = PrettyTable(["Spell", *args])
+                key = normalize(line)
+                if not key:
+                    continue
+                if key not in masks:
+                    masks[key] = 0
+                    names[key] = line.strip()
+                masks[key] |= bit
+    return masks, names
+
+
+def file_mask(files: List[str], selected: Iterable[str]) -> int:
+    """
+    Return the bitmask of the selected files, each given as a file name or its index.
+
+    Raises ValueError for a selector that is neither a listed file nor the index of one.
+    """
+    mask = 0
+    for name in selected:
+        if name in files:
+            index = files.index(name)
+        else:
+            try:
+                index = int(name)
+            except ValueError:
+                raise ValueError(f"{name} is not one of the files or a file index") from None
+            if not 0 <= index < len(files):
+                raise ValueError(f"file index {index} is out of range, there are {len(files)} files")
+        mask |= 1 << index
+    return mask
+
+
+def query(masks: Dict[str, int], count: int, in_all: bool = False, exactly: Optional[int] = None,
+          including: Optional[int] = None, only_in: Optional[int] = None,
+          missing_from: Optional[int] = None) -> Iterable[Tuple[str, int]]:
+    """
+    Yield the (key, mask) of spells matching every given condition, sorted by key.
+
+    in_all keeps spells in every file, exactly those in precisely the files of the mask,
+    including those in at least all of them, only_in those in no file outside them and
+    missing_from those in none of them.
+    """
+    everything = (1 << count) - 1
+    for key in sorted(masks):
+        mask = masks[key]
+        if in_all and mask != everything:
+            continue
+        if exactly is not None and mask != exactly:
+            continue
+        if including is not None and mask & including != including:
+            continue
+        if only_in is not None and mask & ~only_in:
+            continue
+        if missing_from is not None and mask & missing_from:
+            continue
+        yield key, mask
+
+
+def write_table(rows: Iterable[Tuple[str, int]], names: Dict[str, str], files: List[str]) -> None:
+    from prettytable import PrettyTable
+    t = PrettyTable(["Spell", *files])
     t.padding_width = 1
     t.padding_height = 0
-    for k,v in sorted(r.items()):
-        t.add_row([k,*v])
+    for key, mask in rows:
+        t.add_row([names[key], *("X" if mask >> i & 1 else "" for i in range(len(files)))])
     print(t)
 
+
+def write_csv(rows: Iterable[Tuple[str, int]], names: Dict[str, str], files: List[str]) -> None:
+    writer = csv.writer(sys.stdout, lineterminator='\n')
+    writer.writerow(["Spell", *files])
+    for key, mask in rows:
+        writer.writerow([names[key], *("X" if mask >> i & 1 else "" for i in range(len(files)))])
+
+
+def write_json(rows: Iterable[Tuple[str, int]], names: Dict[str, str], files: List[str]) -> None:
+    """Write a json list of {"spell", "files"} objects, one per line as they are produced."""
+    sys.stdout.write('[')
+    for i, (key, mask) in enumerate(rows):
+        sys.stdout.write(',\n' if i else '\n')
+        sys.stdout.write(json.dumps({'spell': names[key],
+                                     'files': [name for j, name in enumerate(files) if mask >> j & 1]}))
+    sys.stdout.write('\n]\n')
+
+
+WRITERS = {'table': write_table, 'csv': write_csv, 'json': write_json}
+
+
+def main(args=None):
+    if args is None:
+        args = sys.argv
+    parser = argparse.ArgumentParser(description="Compare which spells appear in which files.")
+    parser.add_argument('files', nargs='+', help="Files with one spell per line.")
+    parser.add_argument('--format', choices=list(WRITERS), default='table',
+                        help="Output format, csv and json are written as they are produced.")
+    parser.add_argument('--all', dest='in_all', action='store_true', help="Only spells in every file.")
+    parser.add_argument('--exactly', nargs='+', metavar='FILE', help="Only spells in exactly these files.")
+    parser.add_argument('--including', nargs='+', metavar='FILE', help="Only spells in at least these files.")
+    parser.add_argument('--only-in', nargs='+', metavar='FILE', help="Only spells in no other files than these.")
+    parser.add_argument('--missing-from', nargs='+', metavar='FILE', help="Only spells in none of these files.")
+    options = parser.parse_args(args[1:])
+    files = options.files
+    try:
+        conditions = {condition: file_mask(files, getattr(options, condition))
+                      for condition in ('exactly', 'including', 'only_in', 'missing_from')
+                      if getattr(options, condition) is not None}
+    except ValueError as e:
+        parser.error(str(e))
+    masks, names = read_membership(files)
+    rows = query(masks, len(files), options.in_all, **conditions)
+    WRITERS[options.format](rows, names, files)
+
+
 if __name__ == "__main__":
     main()
@@ -0,0 +1,65 @@
+#!/usr/bin/env python3
+"""Measure memory per card and filter throughput of a CardInfo list against card_table.CardTable."""
+import argparse
+import os
+import random
+import sys
+import time
+import tracemalloc
+from typing import Iterator
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from card_table import CardTable  # noqa: E402
+from gatherer import CardInfo, ColorMask, colors  # noqa: E402
+
+RARITIES = ['Common', 'Uncommon', 'Rare', 'Mythic Rare', 'Basic Land']
+TYPES = ['Creature — Elf', 'Instant', 'Sorcery', 'Artifact', 'Enchantment', 'Land']
+
+
+def synthetic_cards(count: int, seed: int = 0) -> Iterator[CardInfo]:
+    rng = random.Random(seed)
+    sets = [f'Set {i}' for i in range(200)]
+    for mvid in range(count):
+        name = f'Card {mvid % (count // 4 + 1)}'
+        card_colors = ' '.join(rng.sample(colors[:5], rng.randint(0, 2)))
+        yield CardInfo(name=name, text=f'Rules text for {name}.', types=rng.choice(TYPES),
+                       image_link=f'https://gatherer.wizards.com/Handlers/Image.ashx?multiverseid={mvid}',
+                       power='2 / 2', printing=rng.choice(sets), rarity=rng.choice(RARITIES),
+                       artist=f'Artist {mvid % 300}', color_identity=card_colors,
+                       other_printings=[str(mvid + 1)], number=mvid)
+
+
+def measure(build):
+    tracemalloc.start()
+    result = build()
+    size = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return result, size
+
+
+def main(count: int) -> int:
+    cards, list_size = measure(lambda: list(synthetic_cards(count)))
+    table, table_size = measure(lambda: CardTable(synthetic_cards(count)))
+    print(f"cards: {count}")
+    print(f"list of CardInfo: {list_size / count:.0f} bytes/card")
+    print(f"CardTable:        {table_size / count:.0f} bytes/card")
+
+    wub = ColorMask('White Blue Black')
+    start = time.perf_counter()
+    from_list = [i for i, card in enumerate(cards)
+                 if card.rarity == 'Rare' and card.color_identity.issubset(wub)]
+    list_time = time.perf_counter() - start
+    start = time.perf_counter()
+    from_table = table.where(rarity='Rare', within_colors=wub)
+    table_time = time.perf_counter() - start
+    assert from_list == from_table
+    print(f"rare cards within WUB: {len(from_table)}")
+    print(f"list filter:  {count / list_time / 1e6:.2f}M cards/s")
+    print(f"table filter: {count / table_time / 1e6:.2f}M cards/s")
+    return 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark CardTable memory use and filtering.")
+    parser.add_argument('--count', type=int, default=200000, help="Number of synthetic printings.")
+    sys.exit(main(**vars(parser.parse_args())))
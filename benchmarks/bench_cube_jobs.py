@@ -0,0 +1,39 @@
+#!/usr/bin/env python3
+"""Measure how cube_conversion --jobs scales with the number of processes."""
+import argparse
+import os
+import sys
+import tempfile
+import time
+from typing import List
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+import cube_conversion  # noqa: E402
+from synthetic import write_sheets_csv  # noqa: E402
+
+
+def main(rows: int, tags: int, jobs: List[int]) -> int:
+    with tempfile.TemporaryDirectory() as tmp:
+        sheets = os.path.join(tmp, 'sheets.csv')
+        cobra = os.path.join(tmp, 'cobra.csv')
+        back = os.path.join(tmp, 'back.csv')
+        write_sheets_csv(sheets, rows, tags)
+        print(f"rows: {rows}, tag columns: {tags + 3}, cores: {os.cpu_count()}")
+        for job_count in jobs:
+            start = time.perf_counter()
+            cube_conversion.main(sheets, cobra, to_cube_cobra=True, jobs=job_count)
+            to_cobra = time.perf_counter() - start
+            start = time.perf_counter()
+            cube_conversion.main(cobra, back, to_google_sheets=True, jobs=job_count)
+            to_sheets = time.perf_counter() - start
+            print(f"jobs {job_count:2d}: to CubeCobra {rows / to_cobra:9.0f} rows/s, "
+                  f"to Google Sheets {rows / to_sheets:9.0f} rows/s")
+    return 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark parallel cube conversion.")
+    parser.add_argument('--rows', type=int, default=200000, help="Number of synthetic cards.")
+    parser.add_argument('--tags', type=int, default=40, help="Number of extra tag columns.")
+    parser.add_argument('--jobs', type=int, nargs='+', default=[1, 2, 4, 8], help="Process counts to try.")
+    sys.exit(main(**vars(parser.parse_args())))
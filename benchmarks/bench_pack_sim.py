@@ -0,0 +1,34 @@
+#!/usr/bin/env python3
+"""Measure how many pools per second pack_gen --simulate deals and measures."""
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+import pack_gen  # noqa: E402
+from synthetic import write_sheets_csv  # noqa: E402
+
+
+def main(cards: int, pools: int, players: int, batch: int) -> int:
+    with tempfile.TemporaryDirectory() as tmp:
+        sheets = os.path.join(tmp, 'sheets.csv')
+        write_sheets_csv(sheets, cards)
+        cube = pack_gen.read_cards(sheets)
+    template = {rarity: count // 4 for rarity, count in pack_gen.DEFAULT_TEMPLATE.items()}
+    print(f"cards: {len(cube)}, players: {players}, template: {template}")
+    start = time.perf_counter()
+    stats = pack_gen.simulate(cube, pools, players, template, seed=0, batch=batch)
+    elapsed = time.perf_counter() - start
+    print(f"{len(stats['cmc'])} pools in {elapsed:.2f}s, {len(stats['cmc']) / elapsed:.0f} pools/s")
+    return 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark Monte Carlo pool simulation.")
+    parser.add_argument('--cards', type=int, default=2000, help="Number of synthetic cards in the cube.")
+    parser.add_argument('--pools', type=int, default=200000, help="Number of pools to simulate.")
+    parser.add_argument('--players', type=int, default=8, help="Pools dealt from each shuffle.")
+    parser.add_argument('--batch', type=int, default=2000, help="Shuffles per numpy batch.")
+    sys.exit(main(**vars(parser.parse_args())))
@@ -0,0 +1,73 @@
+#!/usr/bin/env python3
+"""Compare details page parse time of gatherer.extract_page_soup and gatherer.extract_page."""
+import argparse
+import os
+import sys
+import time
+from typing import Callable, List
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+import gatherer  # noqa: E402
+
+PREFIX = gatherer.ROW_PREFIX
+
+
+def sample_page(mvid: int, padding: int = 300) -> bytes:
+    """Build a details page shaped like Gatherer's, with padding rows standing in for the site chrome."""
+    chrome = ''.join(f'<div class="nav"><a href="/Pages/Default.aspx?n={i}">Link {i}</a><span>filler</span></div>'
+                     for i in range(padding))
+    others = ''.join(f'<a href="Details.aspx?multiverseid={mvid + i}"><img alt="Set {i}" src="x"></a>'
+                     for i in range(1, 6))
+    return f'''<html><head><title>Card {mvid}</title></head><body>{chrome}
+<img id="{PREFIX}cardImage" src="../../Handlers/Image.ashx?multiverseid={mvid}&amp;type=card">
+<div id="{PREFIX}nameRow" class="row"><div class="label">Card Name:</div><div class="value"> Card {mvid} </div></div>
+<div id="{PREFIX}manaRow" class="row manaRow"><div class="label">Mana Cost:</div>
+<div class="value"><img alt="2"><img alt="Red"><img alt="Blue"></div></div>
+<div id="{PREFIX}typeRow" class="row"><div class="label">Types:</div><div class="value">Creature — Elf</div></div>
+<div id="{PREFIX}textRow" class="row"><div class="label">Card Text:</div><div class="value">
+<div class="cardtextbox"><img alt="Tap"> Add <img alt="Green">.</div><div class="cardtextbox">Flying</div></div></div>
+<div id="{PREFIX}FlavorText" class="row"><div class="flavortextbox">Flavor for {mvid}</div></div>
+<div id="{PREFIX}ptRow" class="row"><div class="label">P/T:</div><div class="value">2 / 2</div></div>
+<div id="{PREFIX}setRow" class="row"><div class="label">Expansion:</div><div class="value"><a>Set</a></div></div>
+<div id="{PREFIX}rarityRow" class="row"><div class="label">Rarity:</div><div class="value"><span>Rare</span></div></div>
+<div id="{PREFIX}otherSetsRow" class="row"><div id="{PREFIX}otherSetsValue" class="value">{others}</div></div>
+<div id="{PREFIX}artistRow" class="row"><div class="label">Artist:</div><div class="value"><a>Someone</a></div></div>
+{chrome}</body></html>'''.encode()
+
+
+def time_per_page(extract: Callable, pages: List[bytes], repeat: int) -> float:
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for page in pages:
+            extract(page)
+        best = min(best, time.perf_counter() - start)
+    return best / len(pages)
+
+
+def main(files: List[str], count: int, repeat: int) -> int:
+    if files:
+        pages = []
+        for fname in files:
+            with open(fname, 'rb') as page_file:
+                pages.append(page_file.read())
+    else:
+        pages = [sample_page(mvid) for mvid in range(count)]
+    for page in pages:
+        if gatherer.extract_page_soup(page) != gatherer.extract_page(page):
+            print("Extractors disagree on a page", file=sys.stderr)
+            return 1
+    before = time_per_page(gatherer.extract_page_soup, pages, repeat)
+    after = time_per_page(gatherer.extract_page, pages, repeat)
+    print(f"pages: {len(pages)}, average size: {sum(map(len, pages)) // len(pages)} bytes")
+    print(f"BeautifulSoup + find_all: {before * 1000:.3f} ms/page")
+    print(f"single pass lxml:         {after * 1000:.3f} ms/page ({before / after:.1f}x)")
+    return 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark details page field extraction.")
+    parser.add_argument('files', nargs='*', help="Saved details pages to parse, synthetic pages if omitted.")
+    parser.add_argument('--count', type=int, default=50, help="Number of synthetic pages.")
+    parser.add_argument('--repeat', type=int, default=3, help="Take the best of this many runs.")
+    sys.exit(main(**vars(parser.parse_args())))
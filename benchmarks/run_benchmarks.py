@@ -0,0 +1,235 @@
+#!/usr/bin/env python3
+"""
+Run every entry point against synthetic inputs and report throughput, latency and peak memory.
+
+Inputs are generated once from fixed seeds, then each benchmark runs in a fresh process so
+its peak memory is its own. Gatherer fetches go to a local stub server in another process.
+"""
+import argparse
+import contextlib
+import importlib
+import json
+import multiprocessing
+import os
+import resource
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from types import ModuleType
+from typing import Callable, Dict, List, Optional, Tuple
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+import synthetic  # noqa: E402
+
+# Benchmark -> function of its module, the input paths and options returning (items processed, latencies in seconds)
+Result = Tuple[int, List[float]]
+
+
+def bench_to_cube_cobra(cube_conversion: ModuleType, inputs: Dict[str, str], options: Dict) -> Result:
+    cube_conversion.main(inputs['sheets'], inputs['out'], to_cube_cobra=True)
+    return options['rows'], []
+
+
+def bench_to_cube_cobra_snapshot(cube_conversion: ModuleType, inputs: Dict[str, str], options: Dict) -> Result:
+    """Same as bench_to_cube_cobra, but run_one makes the cube snapshot first."""
+    return bench_to_cube_cobra(cube_conversion, inputs, options)
+
+
+def bench_to_google_sheets(cube_conversion: ModuleType, inputs: Dict[str, str], options: Dict) -> Result:
+    cube_conversion.main(inputs['cobra'], inputs['out'], to_google_sheets=True)
+    return options['rows'], []
+
+
+def bench_pack_gen(pack_gen: ModuleType, inputs: Dict[str, str], options: Dict) -> Result:
+    cards = pack_gen.read_cards(inputs['sheets'])
+    sizes = {rarity: len(indices) for rarity, indices in pack_gen.bucket_by_rarity(cards).items()}
+    players = 8
+    template = {rarity: min(count, sizes.get(rarity, 0) // players)
+                for rarity, count in pack_gen.DEFAULT_TEMPLATE.items()}
+    latencies = []
+    for seed in range(options['deals']):
+        start = time.perf_counter()
+        pools = pack_gen.generate_pools(cards, players, template, seed)
+        for player, pool in enumerate(pools):
+            pack_gen.write_pool(f"{inputs['out']}-p{player}.dck", cards, pool)
+        latencies.append(time.perf_counter() - start)
+    return options['deals'] * players, latencies
+
+
+def bench_pack_gen_simulate(pack_gen: ModuleType, inputs: Dict[str, str], options: Dict) -> Result:
+    cards = pack_gen.read_cards(inputs['sheets'])
+    sizes = {rarity: len(indices) for rarity, indices in pack_gen.bucket_by_rarity(cards).items()}
+    template = {rarity: min(count, sizes.get(rarity, 0) // 8) for rarity, count in pack_gen.DEFAULT_TEMPLATE.items()}
+    stats = pack_gen.simulate(cards, options['pools'], 8, template, seed=0)
+    return len(stats['cmc']), []
+
+
+def bench_spells(Spells: ModuleType, inputs: Dict[str, str], options: Dict) -> Result:
+    Spells.main(['Spells.py', *inputs['spells'].split(os.pathsep), '--format', 'csv'])
+    return options['spell_files'] * options['rows'], []
+
+
+def bench_read_dec(gatherer: ModuleType, inputs: Dict[str, str], options: Dict) -> Result:
+    deck, sideboard = gatherer.read_dec(inputs['dec'])
+    return options['rows'], []
+
+
+def bench_read_coll2(gatherer: ModuleType, inputs: Dict[str, str], options: Dict) -> Result:
+    gatherer.read_coll2(inputs['coll2'])
+    return options['rows'], []
+
+
+def bench_get_pages(gatherer: ModuleType, inputs: Dict[str, str], options: Dict) -> Result:
+    """Fetch pages from the stub server run_one started in its own process at inputs['stub_url']."""
+    gatherer.DETAILS_URL = inputs['stub_url']
+    latencies = []
+    fetch_page = gatherer.fetch_page
+
+    def timed_fetch(*args, **kwargs):
+        start = time.perf_counter()
+        try:
+            return fetch_page(*args, **kwargs)
+        finally:
+            latencies.append(time.perf_counter() - start)
+    gatherer.fetch_page = timed_fetch
+    gatherer.get_names(range(1000, 1000 + options['pages']), jobs=options['jobs'])
+    return options['pages'], latencies
+
+
+# Benchmark -> (module it exercises, function)
+BENCHMARKS: Dict[str, Tuple[str, Callable[[ModuleType, Dict[str, str], Dict], Result]]] = {
+    'cube_conversion --to-cube-cobra': ('cube_conversion', bench_to_cube_cobra),
+    'cube_conversion --to-cube-cobra (snapshot)': ('cube_conversion', bench_to_cube_cobra_snapshot),
+    'cube_conversion --to-google-sheets': ('cube_conversion', bench_to_google_sheets),
+    'pack_gen pools': ('pack_gen', bench_pack_gen),
+    'pack_gen --simulate': ('pack_gen', bench_pack_gen_simulate),
+    'Spells --format csv': ('Spells', bench_spells),
+    'gatherer.read_dec': ('gatherer', bench_read_dec),
+    'gatherer.read_coll2': ('gatherer', bench_read_coll2),
+    'gatherer.get_names (stub server)': ('gatherer', bench_get_pages),
+}
+
+
+def start_stub(latency: float) -> Tuple[subprocess.Popen, str]:
+    """Start stub_gatherer in its own process, so serving pages does not share this one's GIL."""
+    script = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'stub_gatherer.py')
+    stub = subprocess.Popen([sys.executable, script, '--latency', str(latency), '--port', '0'],
+                            stdout=subprocess.PIPE, text=True)
+    line = stub.stdout.readline()
+    if not line.startswith('Serving '):
+        stub.kill()
+        raise RuntimeError("stub_gatherer did not start")
+    return stub, line.split(' ', 1)[1].strip()
+
+
+def run_one(name: str, inputs: Dict[str, str], options: Dict, queue) -> None:
+    """
+    Run a benchmark in this (fresh) process and put its measurements on queue.
+
+    The benchmark's module is imported and its inputs set up before timing starts, so only
+    the work itself is measured.
+    """
+    workdir = tempfile.mkdtemp(dir=inputs['dir'])
+    os.chdir(workdir)
+    module_name, benchmark = BENCHMARKS[name]
+    module = importlib.import_module(module_name)
+    stub = None
+    if benchmark is bench_to_cube_cobra_snapshot:
+        import cube
+        cube.load_cube(inputs['sheets'])
+    elif benchmark is bench_to_cube_cobra:
+        snapshot = inputs['sheets'] + '.cube'
+        if os.path.exists(snapshot):
+            os.remove(snapshot)
+    elif benchmark is bench_get_pages:
+        stub, url = start_stub(options['latency'])
+        inputs = dict(inputs, stub_url=url)
+    try:
+        before = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+            start = time.perf_counter()
+            items, latencies = benchmark(module, inputs, options)
+            elapsed = time.perf_counter() - start
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    finally:
+        if stub is not None:
+            stub.terminate()
+            stub.wait()
+    queue.put({'items': items, 'seconds': elapsed, 'latencies': latencies,
+               'peak_kb': peak, 'growth_kb': peak - before})
+
+
+def measure(name: str, inputs: Dict[str, str], options: Dict, repeat: int) -> Dict:
+    """Run a benchmark repeat times in fresh processes, keeping the fastest run and the largest peak."""
+    context = multiprocessing.get_context('spawn')
+    runs = []
+    for _ in range(repeat):
+        queue = context.Queue()
+        process = context.Process(target=run_one, args=(name, inputs, options, queue))
+        process.start()
+        runs.append(queue.get())
+        process.join()
+    best = min(runs, key=lambda run: run['seconds'])
+    latencies = sorted(best['latencies'])
+    res = {'benchmark': name, 'items': best['items'], 'seconds': best['seconds'],
+           'items_per_second': best['items'] / best['seconds'],
+           'peak_mb': max(run['peak_kb'] for run in runs) / 1024,
+           'growth_mb': max(run['growth_kb'] for run in runs) / 1024}
+    if latencies:
+        res['p50_ms'] = statistics.median(latencies) * 1000
+        res['p95_ms'] = latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))] * 1000
+    return res
+
+
+def generate_inputs(directory: str, options: Dict) -> Dict[str, str]:
+    rows = options['rows']
+    inputs = {'dir': directory,
+              'sheets': os.path.join(directory, 'sheets.csv'),
+              'cobra': os.path.join(directory, 'cobra.csv'),
+              'dec': os.path.join(directory, 'deck.dec'),
+              'coll2': os.path.join(directory, 'collection.coll2'),
+              'out': os.path.join(directory, 'out')}
+    synthetic.write_sheets_csv(inputs['sheets'], rows, options['tags'])
+    synthetic.write_cobra_csv(inputs['cobra'], rows, options['tags'])
+    synthetic.write_dec(inputs['dec'], rows)
+    synthetic.write_coll2(inputs['coll2'], rows)
+    inputs['spells'] = os.pathsep.join(synthetic.write_spell_lists(directory, options['spell_files'], rows))
+    return inputs
+
+
+def main(rows: int, tags: int, pages: int, latency: float, jobs: int, repeat: int,
+         only: Optional[List[str]], json_file: Optional[str]) -> int:
+    options = {'rows': rows, 'tags': tags, 'pages': pages, 'latency': latency, 'jobs': jobs,
+               'deals': 100, 'pools': 100000, 'spell_files': 4}
+    names = [name for name in BENCHMARKS if not only or any(part in name for part in only)]
+    results = []
+    with tempfile.TemporaryDirectory() as tmp:
+        inputs = generate_inputs(tmp, options)
+        print(f"rows: {rows}, pages: {pages} at {latency:g} ms latency with {jobs} jobs, best of {repeat}")
+        print(f"{'benchmark':<44}{'items/s':>12}{'seconds':>9}{'p50 ms':>9}{'p95 ms':>9}{'peak MB':>9}{'+MB':>8}")
+        for name in names:
+            res = measure(name, inputs, options, repeat)
+            results.append(res)
+            print(f"{name:<44}{res['items_per_second']:>12.0f}{res['seconds']:>9.3f}"
+                  f"{res.get('p50_ms', float('nan')):>9.2f}{res.get('p95_ms', float('nan')):>9.2f}"
+                  f"{res['peak_mb']:>9.1f}{res['growth_mb']:>8.1f}")
+    if json_file:
+        with open(json_file, 'w') as out:
+            json.dump({'options': options, 'results': results}, out, indent=2)
+    return 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark every entry point on synthetic inputs.")
+    parser.add_argument('--rows', type=int, default=10000,
+                        help="Cards in the cube, entries in the dec/coll2 files and lines per spell list.")
+    parser.add_argument('--tags', type=int, default=20, help="Extra tag columns in the cube.")
+    parser.add_argument('--pages', type=int, default=500, help="Pages to fetch from the stub server.")
+    parser.add_argument('--latency', type=float, default=20, help="Stub server latency in milliseconds.")
+    parser.add_argument('--jobs', type=int, default=8, help="Concurrent page fetches.")
+    parser.add_argument('--repeat', type=int, default=3, help="Runs per benchmark, the fastest is reported.")
+    parser.add_argument('--only', type=str, nargs='+', help="Only run benchmarks whose name contains one of these.")
+    parser.add_argument('--json', dest='json_file', type=str, help="Also write the results to this json file.")
+    sys.exit(main(**vars(parser.parse_args())))
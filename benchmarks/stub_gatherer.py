@@ -0,0 +1,91 @@
+#!/usr/bin/env python3
+"""Local stand-in for the Gatherer card details pages, with configurable latency."""
+import argparse
+import gzip
+import http.server
+import os
+import sys
+import threading
+import time
+import urllib.parse
+from typing import Optional
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from bench_parse import sample_page  # noqa: E402
+
+
+class DetailsHandler(http.server.BaseHTTPRequestHandler):
+    """
+    Serve Details.aspx?multiverseid=N from pages_dir/N.html if it exists, else a sample_page.
+
+    Responses wait latency seconds, are gzipped when the client accepts it and carry an ETag
+    so conditional requests get a 304.
+    """
+    protocol_version = 'HTTP/1.1'
+    # Without this every response waits on the client's delayed ACK
+    disable_nagle_algorithm = True
+    latency = 0.0
+    pages_dir: Optional[str] = None
+
+    def do_GET(self):
+        query = urllib.parse.parse_qs(urllib.parse.urlsplit(self.path).query)
+        mvid = query.get('multiverseid', ['0'])[0]
+        time.sleep(self.latency)
+        etag = f'"{mvid}"'
+        if self.headers.get('If-None-Match') == etag:
+            self.send_response(304)
+            self.send_header('ETag', etag)
+            self.send_header('Content-Length', '0')
+            self.end_headers()
+            return
+        recorded = os.path.join(self.pages_dir, f'{mvid}.html') if self.pages_dir else None
+        if recorded and os.path.exists(recorded):
+            with open(recorded, 'rb') as inp:
+                body = inp.read()
+        elif mvid.isdigit():
+            body = sample_page(int(mvid))
+        else:
+            self.send_error(404)
+            return
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/html; charset=utf-8')
+        self.send_header('ETag', etag)
+        if 'gzip' in self.headers.get('Accept-Encoding', ''):
+            body = gzip.compress(body, 6)
+            self.send_header('Content-Encoding', 'gzip')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def serve(latency: float = 0.0, pages_dir: Optional[str] = None, port: int = 0) -> str:
+    """
+    Start the server on a background thread and return the gatherer.DETAILS_URL pointing at it.
+    """
+    handler = type('Handler', (DetailsHandler,), {'latency': latency, 'pages_dir': pages_dir})
+    server = http.server.ThreadingHTTPServer(('127.0.0.1', port), handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return f'http://127.0.0.1:{server.server_port}/Pages/Card/Details.aspx?multiverseid={{}}'
+
+
+def main(latency: float, pages_dir: Optional[str], port: int) -> int:
+    url = serve(latency / 1000, pages_dir, port)
+    print(f"Serving {url}", flush=True)
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Serve Gatherer style card details pages locally.")
+    parser.add_argument('--latency', type=float, default=0, help="Milliseconds to wait before each response.")
+    parser.add_argument('--pages-dir', type=str, help="Directory of recorded pages named <multiverseid>.html.")
+    parser.add_argument('--port', type=int, default=8000, help="Port to listen on.")
+    sys.exit(main(**vars(parser.parse_args())))
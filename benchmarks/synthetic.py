@@ -0,0 +1,83 @@
+#!/usr/bin/env python3
+"""Generators for synthetic inputs used by the benchmarks."""
+import csv
+import os
+import random
+import sys
+from typing import Iterator, List
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from cube_conversion import SPECIAL_COLUMNS, convert_to_cube_cobra, write_rows  # noqa: E402
+
+RARITIES = ['C', 'U', 'R', 'L', 'C-C', 'U-C']
+COLORS = ['W', 'U', 'B', 'R', 'G', 'GW', 'RW', 'GU', 'W/B', 'C', '']
+TYPE_LINES = ['Creature — Elf Warrior', 'Instant', 'Sorcery', 'Artifact — Equipment',
+              'Legendary Creature — Human, Wizard', 'Land']
+
+
+def sheets_rows(rows: int, tags: int = 20, seed: int = 0) -> Iterator[List[str]]:
+    """Yield the header and rows cards of a Google Sheets style cube csv with tags extra 0/1 tag columns."""
+    rng = random.Random(seed)
+    tag_columns = ['Main Theme', 'Secondary Theme', 'Tertiary Theme'] + [f'Tag {i}' for i in range(tags)]
+    yield SPECIAL_COLUMNS + tag_columns
+    for i in range(rows):
+        yield ([f'Card {i}, the Synthetic' if i % 7 == 0 else f'Card {i}', rng.choice(RARITIES),
+                rng.choice(COLORS), str(rng.randint(0, 8)), rng.choice(['', '2.5', '3', '4.5']),
+                f'S{i % 40:02d}', str(i % 300 + 1), rng.choice('01'), rng.choice('01'),
+                rng.choice('01'), f'https://img.example/{i}.jpg', rng.choice(['', '1', '3']),
+                rng.choice(['', '2', '4']), rng.choice(TYPE_LINES)]
+               + [rng.choice(['1', '0', '0', '']) for _ in tag_columns])
+
+
+def write_sheets_csv(path: str, rows: int, tags: int = 20, seed: int = 0) -> None:
+    """Write a Google Sheets style cube csv with rows cards and tags extra 0/1 tag columns."""
+    with open(path, 'w', newline='') as out_file:
+        csv.writer(out_file).writerows(sheets_rows(rows, tags, seed))
+
+
+def write_cobra_csv(path: str, rows: int, tags: int = 20, seed: int = 0) -> None:
+    """Write the CubeCobra csv of the cube write_sheets_csv would write with the same arguments."""
+    generated = sheets_rows(rows, tags, seed)
+    header = next(generated)
+    write_rows(convert_to_cube_cobra(dict(zip(header, row)) for row in generated), path)
+
+
+def write_dec(path: str, entries: int, seed: int = 0, first_mvid: int = 1000) -> None:
+    """Write a dec file of entries cards, about a tenth of them in the sideboard, named like the stub server's."""
+    rng = random.Random(seed)
+    with open(path, 'w') as out_file:
+        for i in range(entries):
+            mvid = first_mvid + i
+            qty = rng.randint(1, 4)
+            loc, prefix = ('SB', 'SB: ') if rng.random() < 0.1 else ('Deck', '')
+            if i:
+                out_file.write('\n')
+            out_file.write(f'///mvid:{mvid} qty:{qty} name:Card {mvid} loc:{loc}\n{prefix}{qty} Card {mvid}')
+
+
+def write_coll2(path: str, items: int, seed: int = 0, first_mvid: int = 1000) -> None:
+    """Write a coll2 file of items cards, some with foil copies."""
+    rng = random.Random(seed)
+    with open(path, 'w') as out_file:
+        out_file.write('doc:\n- version: 1\n- items:')
+        for i in range(items):
+            out_file.write(f'\n  - - id: {first_mvid + i}\n    - r: {rng.randint(1, 4)}')
+            if rng.random() < 0.2:
+                out_file.write(f'\n    - f: {rng.randint(1, 2)}')
+
+
+def write_spell_lists(directory: str, files: int, lines: int, seed: int = 0) -> List[str]:
+    """
+    Write files spell lists of lines spells each, drawn from a pool twice that size with
+    varying case and whitespace, returning their paths.
+    """
+    rng = random.Random(seed)
+    pool = [f'Spell {i}' for i in range(lines * 2)]
+    paths = []
+    for i in range(files):
+        path = os.path.join(directory, f'spells{i}.txt')
+        with open(path, 'w') as out_file:
+            for spell in rng.sample(pool, lines):
+                out_file.write((spell.upper() if rng.random() < 0.1 else spell) + ' ' * rng.randint(0, 1) + '\n')
+        paths.append(path)
+    return paths
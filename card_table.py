@@ -0,0 +1,178 @@
+#!/usr/bin/env python3
+"""Column-wise storage for large numbers of gatherer.CardInfo printings."""
+import sys
+from array import array
+from typing import Dict, Iterable, Iterator, List, Optional, Sequence
+
+import gatherer
+from gatherer import CardInfo, ColorMask
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+STRING_COLUMNS = ('name', 'cost', 'text', 'flavor_text', 'supertypes', 'types', 'subtypes',
+                  'image_link', 'power', 'toughness', 'artist')
+CODED_COLUMNS = ('printing', 'rarity')
+
+
+def intern_value(value):
+    """Intern a string column value, or every string in it if it is a tuple like the type fields."""
+    if isinstance(value, str):
+        return sys.intern(value)
+    return tuple(sys.intern(str(item)) for item in value)
+
+
+def filter_colors(masks: Sequence[int], within=None, including=None, exactly=None) -> List[int]:
+    """
+    Return the indices of the color masks matching every given condition.
+
+    within keeps masks that are a subset of it, including those that are a superset of it
+    and exactly those equal to it. Each accepts anything ColorMask does. The comparisons run
+    as whole array operations when numpy is installed.
+    """
+    conditions = [(ColorMask(mask), kind) for mask, kind in
+                  ((within, 'within'), (including, 'including'), (exactly, 'exactly')) if mask is not None]
+    if numpy is not None:
+        if isinstance(masks, array) and masks.typecode == 'B':
+            values = numpy.frombuffer(masks, dtype=numpy.uint8)
+        else:
+            values = numpy.asarray(masks, dtype=numpy.uint8)
+        keep = numpy.ones(len(values), dtype=bool)
+        for mask, kind in conditions:
+            if kind == 'within':
+                keep &= (values & (~mask & 0x3f)) == 0
+            elif kind == 'including':
+                keep &= (values & mask) == mask
+            else:
+                keep &= values == mask
+        return numpy.flatnonzero(keep).tolist()
+    indices = range(len(masks))
+    for mask, kind in conditions:
+        if kind == 'within':
+            indices = [i for i in indices if not masks[i] & ~mask]
+        elif kind == 'including':
+            indices = [i for i in indices if masks[i] & mask == mask]
+        else:
+            indices = [i for i in indices if masks[i] == mask]
+    return list(indices)
+
+
+def filter_collection(mvids: Iterable, within=None, including=None, exactly=None,
+                      jobs: int = 8, rate: Optional[float] = None) -> List:
+    """
+    Return the distinct cards of a collection whose color identity matches every given condition.
+
+    See filter_colors for the conditions. Color identities are looked up in one batch.
+    """
+    identities = gatherer.get_color_identities(mvids, jobs, rate)
+    cards = list(identities)
+    masks = array('B', (identities[card] for card in cards))
+    return [cards[i] for i in filter_colors(masks, within, including, exactly)]
+
+
+class Vocabulary:
+    """Two way mapping between interned strings and small integer codes."""
+
+    def __init__(self):
+        self.codes: Dict[str, int] = {}
+        self.values: List[str] = []
+
+    def code(self, value: str) -> int:
+        code = self.codes.get(value)
+        if code is None:
+            code = len(self.values)
+            value = sys.intern(value)
+            self.codes[value] = code
+            self.values.append(value)
+        return code
+
+    def find(self, value: str) -> int:
+        """Return the code for value, or -1 if it has never been stored."""
+        return self.codes.get(value, -1)
+
+
+class CardTable:
+    """
+    Many cards stored one column at a time.
+
+    Free text columns are lists of interned strings, or tuples of them where the card holds
+    one like the default type fields, so a stored card reads back equal. Printing and rarity
+    are stored as integer codes into a per-column Vocabulary and colors as a ColorMask, so
+    repeated values are held once and filters compare small integers.
+    """
+
+    def __init__(self, cards: Iterable[CardInfo] = ()):
+        self.strings: Dict[str, list] = {column: [] for column in STRING_COLUMNS}
+        self.vocabularies: Dict[str, Vocabulary] = {column: Vocabulary() for column in CODED_COLUMNS}
+        self.codes: Dict[str, array] = {column: array('H') for column in CODED_COLUMNS}
+        self.colors = array('B')
+        self.numbers = array('l')
+        self.other_printings: List[tuple] = []
+        self.extend(cards)
+
+    def __len__(self) -> int:
+        return len(self.numbers)
+
+    def append(self, card: CardInfo) -> None:
+        for column, values in self.strings.items():
+            values.append(intern_value(getattr(card, column)))
+        for column, codes in self.codes.items():
+            codes.append(self.vocabularies[column].code(str(getattr(card, column))))
+        self.colors.append(card.color_identity)
+        self.numbers.append(card.number)
+        self.other_printings.append(tuple(card.other_printings))
+
+    def extend(self, cards: Iterable[CardInfo]) -> None:
+        for card in cards:
+            self.append(card)
+
+    def __getitem__(self, index: int) -> CardInfo:
+        kwargs = {column: values[index] for column, values in self.strings.items()}
+        for column, codes in self.codes.items():
+            kwargs[column] = self.vocabularies[column].values[codes[index]]
+        return CardInfo(color_identity=self.colors[index], number=self.numbers[index],
+                        other_printings=self.other_printings[index], **kwargs)
+
+    def __iter__(self) -> Iterator[CardInfo]:
+        for index in range(len(self)):
+            yield self[index]
+
+    def where(self, rarity: Optional[str] = None, printing: Optional[str] = None,
+              within_colors=None, has_colors=None, exact_colors=None) -> List[int]:
+        """
+        Return the indices of the cards matching every given condition.
+
+        within_colors keeps cards whose colors are a subset of the mask, has_colors those
+        containing every color in the mask and exact_colors those with exactly those colors.
+        """
+        if within_colors is None and has_colors is None and exact_colors is None:
+            indices = range(len(self))
+        else:
+            indices = filter_colors(self.colors, within_colors, has_colors, exact_colors)
+        for column, value in (('rarity', rarity), ('printing', printing)):
+            if value is None:
+                continue
+            code = self.vocabularies[column].find(value)
+            codes = self.codes[column]
+            if numpy is not None:
+                indices = numpy.asarray(indices, dtype=numpy.intp)
+                indices = indices[numpy.frombuffer(codes, dtype=numpy.uint16)[indices] == code]
+            else:
+                indices = [i for i in indices if codes[i] == code]
+        return list(indices) if numpy is None else numpy.asarray(indices, dtype=numpy.intp).tolist()
+
+    def select(self, indices: Iterable[int]) -> 'CardTable':
+        """Return a new table with the cards at indices, sharing this table's vocabularies."""
+        table = CardTable()
+        table.vocabularies = self.vocabularies
+        for index in indices:
+            for column, values in self.strings.items():
+                table.strings[column].append(values[index])
+            for column, codes in self.codes.items():
+                table.codes[column].append(codes[index])
+            table.colors.append(self.colors[index])
+            table.numbers.append(self.numbers[index])
+            table.other_printings.append(self.other_printings[index])
+        return table
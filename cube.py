@@ -0,0 +1,313 @@
+#!/usr/bin/env python3
+"""Column-wise model of the Google Sheets csv storage for cube, with a memory mappable snapshot."""
+import argparse
+import csv
+import json
+import math
+import mmap
+import os
+import struct
+import sys
+from array import array
+from typing import Dict, Iterable, List, Mapping, Optional, Sequence, Tuple
+
+RARITY_MAP = {'C': 'Common', 'U': 'Uncommon', 'R': 'Rare', 'L': 'Land'}
+# Rarity codes index this list, the last being anything not in RARITY_MAP
+RARITIES = list(RARITY_MAP.values()) + ['No Rarity']
+COLOR_LETTERS = 'WUBRG'
+SPECIAL_COLUMNS = ['Card Name', 'Rarity', 'Colors', 'CMC', 'Rating', 'Set',
+                   'Collector Number', 'Have Copy', 'Premium', 'Foil',
+                   'Image URL', 'Power', 'Toughness', 'Type Line']
+SPECIAL_COLUMN_SET = frozenset(SPECIAL_COLUMNS)
+THEME_COLUMNS = ('Main Theme', 'Secondary Theme', 'Tertiary Theme')
+# Older sheets spell some columns differently
+COLUMN_ALIASES = {"Collector's Number": 'Collector Number'}
+# Few distinct values, stored as codes into a vocabulary
+CODED_COLUMNS = ('Rarity', 'Colors', 'CMC', 'Rating', 'Set', 'Power', 'Toughness', 'Type Line') + THEME_COLUMNS
+# Mostly distinct values, stored as offsets into one utf-8 blob
+TEXT_COLUMNS = ('Card Name', 'Collector Number', 'Image URL')
+HAVE_COPY, PREMIUM, FOIL, MAYBEBOARD = 1, 2, 4, 8
+
+MAGIC = b'CUBESNAP'
+VERSION = 1
+
+
+def color_mask(colors: str) -> int:
+    """Return the WUBRG bits of a Colors value, 0 for colorless."""
+    colors = colors.upper()
+    return sum(1 << i for i, letter in enumerate(COLOR_LETTERS) if letter in colors)
+
+
+def rarity_flags(row: Mapping[str, str]) -> Tuple[int, int]:
+    """Return the code into RARITIES and the flags of a card's raw special column values."""
+    rarity = row['Rarity']
+    flags = 0
+    if rarity.endswith('-C'):
+        flags |= MAYBEBOARD
+        rarity = rarity[:-2]
+    for column, bit in (('Have Copy', HAVE_COPY), ('Premium', PREMIUM), ('Foil', FOIL)):
+        if row[column] == '1':
+            flags |= bit
+    return RARITIES.index(RARITY_MAP.get(rarity, 'No Rarity')), flags
+
+
+def parse_number(value: str) -> float:
+    try:
+        return float(value)
+    except ValueError:
+        return math.nan
+
+
+class Cube:
+    """
+    Every card of a cube stored one column at a time.
+
+    Raw values of the special columns are kept, either as codes into a per column vocabulary
+    or in a text blob, so the csv can be reproduced. Alongside them rarity is a code into
+    RARITIES, colors a WUBRG bit mask, cmc and rating floats (nan if blank), ownership, foil
+    and maybeboard bits in flags, and every other column a bit of the card's tag bitset,
+    set when its value is 1. Rows without a card name are skipped.
+    """
+
+    def __init__(self, header: Sequence[str] = ()):
+        self.header = [COLUMN_ALIASES.get(column, column) for column in header]
+        self.tag_names = [column for column in self.header if column not in SPECIAL_COLUMN_SET]
+        self.tag_words = (len(self.tag_names) + 63) // 64
+        self.vocabularies: Dict[str, List[str]] = {column: [] for column in CODED_COLUMNS}
+        self._codes: Dict[str, Dict[str, int]] = {column: {} for column in CODED_COLUMNS}
+        self.codes: Dict[str, Sequence[int]] = {column: array('H') for column in CODED_COLUMNS}
+        self.offsets: Dict[str, Sequence[int]] = {column: array('Q', [0]) for column in TEXT_COLUMNS}
+        self.text: Dict[str, bytes] = {column: bytearray() for column in TEXT_COLUMNS}
+        self.rarity: Sequence[int] = array('B')
+        self.colors: Sequence[int] = array('B')
+        self.cmc: Sequence[float] = array('d')
+        self.rating: Sequence[float] = array('d')
+        self.flags: Sequence[int] = array('B')
+        self.tags: Sequence[int] = array('Q')
+        self.source: Optional[Dict[str, int]] = None
+        positions = {column: i for i, column in reversed(list(enumerate(self.header)))}
+        self._positions = {column: positions.get(column, -1) for column in SPECIAL_COLUMNS + list(THEME_COLUMNS)}
+        self._tag_positions = [positions[column] for column in self.tag_names]
+
+    def __len__(self) -> int:
+        return len(self.rarity)
+
+    def row_values(self, values: Sequence[str]) -> Dict[str, str]:
+        """Return the raw special and theme column values of a row of csv values in the order of the header."""
+        size = len(values)
+        return {column: values[position] if 0 <= position < size else ''
+                for column, position in self._positions.items()}
+
+    def row_tags(self, values: Sequence[str]) -> int:
+        """Return the tag bitset of a row of csv values in the order of the header."""
+        size = len(values)
+        bits = 0
+        for i, position in enumerate(self._tag_positions):
+            if position < size and values[position] == '1':
+                bits |= 1 << i
+        return bits
+
+    def tag_list(self, bits: int) -> List[str]:
+        """Return the tag columns set in a tag bitset, in header order."""
+        res = []
+        while bits:
+            low = bits & -bits
+            res.append(self.tag_names[low.bit_length() - 1])
+            bits ^= low
+        return res
+
+    def append(self, values: Sequence[str]) -> None:
+        """Add a row of csv values in the order of the header."""
+        row = self.row_values(values)
+        if len(row['Card Name']) == 0:
+            return
+        for column in CODED_COLUMNS:
+            value = row[column]
+            code = self._codes[column].get(value)
+            if code is None:
+                code = self._codes[column][value] = len(self.vocabularies[column])
+                self.vocabularies[column].append(value)
+            self.codes[column].append(code)
+        for column in TEXT_COLUMNS:
+            text = self.text[column]
+            text += row[column].encode()
+            self.offsets[column].append(len(text))
+        rarity, flags = rarity_flags(row)
+        self.rarity.append(rarity)
+        self.colors.append(color_mask(row['Colors']))
+        self.cmc.append(parse_number(row['CMC']))
+        self.rating.append(parse_number(row['Rating']))
+        self.flags.append(flags)
+        bits = self.row_tags(values)
+        self.tags.extend((bits >> (64 * word)) & 0xffffffffffffffff for word in range(self.tag_words))
+
+    @classmethod
+    def from_entries(cls, entries: Iterable[Mapping[str, str]]) -> 'Cube':
+        """Build a cube from csv.DictReader style entries."""
+        cube = None
+        for entry in entries:
+            if cube is None:
+                cube = cls(list(entry))
+            cube.append(list(entry.values()))
+        return cls() if cube is None else cube
+
+    @classmethod
+    def from_csv(cls, filename: str) -> 'Cube':
+        with open(filename, newline='') as csv_file:
+            reader = csv.reader(csv_file)
+            cube = cls(next(reader, []))
+            for values in reader:
+                cube.append(values)
+        return cube
+
+    def value(self, column: str, index: int) -> str:
+        """Return the raw csv value of a special or theme column for the card at index."""
+        column = COLUMN_ALIASES.get(column, column)
+        if column in self.offsets:
+            offsets = self.offsets[column]
+            return bytes(self.text[column][offsets[index]:offsets[index + 1]]).decode()
+        return self.vocabularies[column][self.codes[column][index]]
+
+    def column(self, column: str) -> List[str]:
+        """Return the raw csv values of a special or theme column for every card."""
+        column = COLUMN_ALIASES.get(column, column)
+        if column in self.offsets:
+            offsets, text = self.offsets[column], self.text[column]
+            return [bytes(text[offsets[i]:offsets[i + 1]]).decode() for i in range(len(self))]
+        vocabulary = self.vocabularies[column]
+        return [vocabulary[code] for code in self.codes[column]]
+
+    def values(self, index: int) -> Dict[str, str]:
+        """Return the raw values of the coded and text columns of the card at index."""
+        return {column: self.value(column, index) for column in CODED_COLUMNS + TEXT_COLUMNS}
+
+    def rarity_name(self, index: int) -> str:
+        return RARITIES[self.rarity[index]]
+
+    def tag_bits(self, index: int) -> int:
+        """Return the tag bitset of the card at index."""
+        bits = 0
+        for word in range(self.tag_words):
+            bits |= self.tags[index * self.tag_words + word] << (64 * word)
+        return bits
+
+    def tags_of(self, index: int) -> List[str]:
+        """Return the tag columns set for the card at index, in header order."""
+        return self.tag_list(self.tag_bits(index))
+
+    def save(self, filename: str, source: Optional[Dict[str, int]] = None) -> None:
+        """
+        Write the cube as a snapshot for load_snapshot.
+
+        The snapshot is a json description followed by every column as raw machine values,
+        each 8 byte aligned, so loading it maps the file instead of parsing anything.
+        source records the csv the snapshot was made from.
+        """
+        sections = [(f'codes/{column}', codes) for column, codes in self.codes.items()]
+        sections += [(f'offsets/{column}', offsets) for column, offsets in self.offsets.items()]
+        sections += [(f'text/{column}', bytes(text)) for column, text in self.text.items()]
+        sections += [(name, getattr(self, name)) for name in ('rarity', 'colors', 'cmc', 'rating', 'flags', 'tags')]
+        layout = {}
+        position = 0
+        for name, values in sections:
+            data = memoryview(values)
+            layout[name] = [data.format, position, data.nbytes]
+            position += (data.nbytes + 7) & ~7
+        meta = json.dumps({'version': VERSION, 'header': self.header, 'vocabularies': self.vocabularies,
+                           'layout': layout, 'source': source}).encode()
+        start = (len(MAGIC) + 8 + len(meta) + 7) & ~7
+        # Replace rather than overwrite, the old snapshot may still be mapped
+        temporary = f'{filename}.{os.getpid()}.tmp'
+        with open(temporary, 'wb') as out:
+            out.write(MAGIC + struct.pack('<Q', len(meta)) + meta)
+            out.write(b'\0' * (start - out.tell()))
+            for name, values in sections:
+                data = memoryview(values)
+                out.write(data.cast('B'))
+                out.write(b'\0' * (-data.nbytes % 8))
+        os.replace(temporary, filename)
+
+    @classmethod
+    def load_snapshot(cls, filename: str) -> 'Cube':
+        """Map a snapshot written by save, reading columns straight from the mapped file."""
+        with open(filename, 'rb') as inp:
+            data = mmap.mmap(inp.fileno(), 0, access=mmap.ACCESS_READ)
+        view = memoryview(data)
+        if bytes(view[:len(MAGIC)]) != MAGIC:
+            raise ValueError(f"{filename} is not a cube snapshot")
+        meta_size, = struct.unpack_from('<Q', data, len(MAGIC))
+        meta = json.loads(bytes(view[len(MAGIC) + 8:len(MAGIC) + 8 + meta_size]))
+        if meta['version'] != VERSION:
+            raise ValueError(f"{filename} is a version {meta['version']} snapshot, expected {VERSION}")
+        cube = cls(meta['header'])
+        cube.vocabularies = meta['vocabularies']
+        cube._codes = {column: {value: code for code, value in enumerate(values)}
+                       for column, values in cube.vocabularies.items()}
+        start = (len(MAGIC) + 8 + meta_size + 7) & ~7
+        for name, (typecode, offset, size) in meta['layout'].items():
+            values = view[start + offset:start + offset + size].cast(typecode)
+            kind, _, column = name.partition('/')
+            if column:
+                getattr(cube, kind)[column] = values
+            else:
+                setattr(cube, name, values)
+        cube.source = meta['source']
+        return cube
+
+
+def csv_source(filename: str) -> Dict[str, int]:
+    stat = os.stat(filename)
+    return {'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns}
+
+
+def current_snapshot(filename: str, snapshot: Optional[str] = None) -> Optional[Cube]:
+    """
+    Return the cube in filename's snapshot if the csv has not changed since it was made, else None.
+
+    The snapshot defaults to filename.cube. filename may also be a snapshot itself.
+    """
+    with open(filename, 'rb') as inp:
+        if inp.read(len(MAGIC)) == MAGIC:
+            return Cube.load_snapshot(filename)
+    snapshot = filename + '.cube' if snapshot is None else snapshot
+    if not os.path.exists(snapshot):
+        return None
+    try:
+        cube = Cube.load_snapshot(snapshot)
+    except (ValueError, KeyError, struct.error):
+        return None
+    return cube if cube.source == csv_source(filename) else None
+
+
+def load_cube(filename: str, snapshot: Optional[str] = None) -> Cube:
+    """
+    Load the cube in a csv file, reusing its snapshot when the csv has not changed since.
+
+    The snapshot defaults to filename.cube and is rewritten whenever the csv is parsed.
+    filename may also be a snapshot itself.
+    """
+    cube = current_snapshot(filename, snapshot)
+    if cube is not None:
+        return cube
+    source = csv_source(filename)
+    cube = Cube.from_csv(filename)
+    try:
+        cube.save(filename + '.cube' if snapshot is None else snapshot, source)
+    except OSError:
+        pass
+    return cube
+
+
+def main(input_file: str, output_file: Optional[str] = None) -> int:
+    """Write the snapshot of the cube in input_file."""
+    cube = Cube.from_csv(input_file)
+    cube.save(output_file or input_file + '.cube', csv_source(input_file))
+    print(f"Saved {len(cube)} cards with {len(cube.tag_names)} tag columns")
+    return 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Snapshot the Google Sheets csv for cube for fast loading.")
+    parser.add_argument('--input-file', type=str, help="The Google Sheets csv to snapshot.", required=True)
+    parser.add_argument('--output-file', type=str, help="The snapshot to write, default the csv name plus .cube.")
+    sys.exit(main(**vars(parser.parse_args())))
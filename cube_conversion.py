@@ -1,17 +1,24 @@
 #!/usr/bin/env python3
 """Convert from Google Sheets csv storage for cube to CubeCobra csv."""
 import argparse
+import contextlib
 import csv
+import hashlib
+import io
+import json
+import mmap
+import os
 import sys
-from collections import OrderedDict
-from typing import Dict, Iterable, List, Set, Union
+from collections import Counter, OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from itertools import accumulate, chain, islice
+from typing import BinaryIO, Dict, Iterable, List, Optional, Set, Tuple, Union
+
+from cube import (FOIL, HAVE_COPY, MAYBEBOARD, PREMIUM, RARITIES, RARITY_MAP, SPECIAL_COLUMNS,
+                  Cube, csv_source, current_snapshot, rarity_flags)
 
-RARITY_MAP = {'C': 'Common', 'U': 'Uncommon', 'R': 'Rare', 'L': 'Land'}
 REVERSE_RARITY_MAP = {value: key for key, value in RARITY_MAP.items()}
 COLOR_MAP = {"GW": "WG", "RW": "WR", "GU": "UG"}
-SPECIAL_COLUMNS = ['Card Name', 'Rarity', 'Colors', 'CMC', 'Rating', 'Set',
-                   'Collector Number', 'Have Copy', 'Premium', 'Foil',
-                   'Image URL', 'Power', 'Toughness', 'Type Line']
 RATING_PREFIX = "Rating"
 POWER_PREFIX = "Power"
 TOUGHNESS_PREFIX = "Toughness"
@@ -27,131 +34,424 @@ def read_file(filename: str) -> Iterable[OrderedDict]:
             yield entry
 
 
-def convert_to_cube_cobra(entries: Iterable[OrderedDict]) -> Iterable[str]:
-    """Provide a stream of lines for a cube_cobra csv corresponding to the same entries."""
-    yield "Name,CMC,Type,Color,Set,Collector Number,Status,Finish,Maybeboard,Image URL,Tags"
-    for entry in entries:
-        if len(entry['Card Name']) == 0:
-            continue
-        name = entry['Card Name']
-        cmc = entry['CMC']
-        color = entry['Colors']
-        color = color.replace('/', '').replace('-', '')
-        if color in COLOR_MAP:
-            color = COLOR_MAP[color]
-        card_set = entry['Set']
-        collector_number = entry['Collector Number']
-        type_line = entry.get('Type Line', '')
-        imgUrl = entry.get('Image URL', '')
-        if entry.get('Premium', None) == '1':
-            status = 'Premium Owned'
-        elif entry.get('Have Copy', None) == '1':
-            status = 'Owned'
-        else:
-            status = 'Not Owned'
-        if entry.get('Foil', None) == '1':
-            finish = "Foil"
+CUBE_COBRA_HEADER = ["Name", "CMC", "Type", "Color", "Set", "Collector Number", "Status", "Finish", "Maybeboard",
+                     "Image URL", "Tags"]
+
+
+def cube_cobra_row(row: Dict[str, str], rarity: int, flags: int, tag_columns: List[str]) -> List[str]:
+    """Convert a card's raw special column values, rarity code, flags and tag columns to a CubeCobra row."""
+    cmc = row['CMC']
+    color = row['Colors'].replace('/', '').replace('-', '')
+    if color in COLOR_MAP:
+        color = COLOR_MAP[color]
+    if flags & PREMIUM:
+        status = 'Premium Owned'
+    elif flags & HAVE_COPY:
+        status = 'Owned'
+    else:
+        status = 'Not Owned'
+    finish = "Foil" if flags & FOIL else "Non-foil"
+    maybe = 'true' if flags & MAYBEBOARD else 'false'
+    tags = [RARITIES[rarity], f'{COLORS_PREFIX}-{row["Colors"]}', f'{CMC_PREFIX}-{cmc}']
+    if len(row['Power']) > 0:
+        tags.append(f'{POWER_PREFIX}-{row["Power"]}')
+    if len(row['Toughness']) > 0:
+        tags.append(f'{TOUGHNESS_PREFIX}-{row["Toughness"]}')
+    if len(row['Rating']) > 0:
+        tags.append(f'{RATING_PREFIX}-{row["Rating"]}')
+    tags += tag_columns
+    tags_str = ",  ".join(tag.strip() for tag in tags)
+    return [row['Card Name'], cmc, row['Type Line'], color, row['Set'], row['Collector Number'], status, finish,
+            maybe, row['Image URL'], tags_str]
+
+
+def convert_values(plan: Cube, values: List[str]) -> Optional[List[str]]:
+    """Convert one csv row of values in the order of plan's header, or return None if it has no card name."""
+    row = plan.row_values(values)
+    if len(row['Card Name']) == 0:
+        return None
+    rarity, flags = rarity_flags(row)
+    return cube_cobra_row(row, rarity, flags, plan.tag_list(plan.row_tags(values)))
+
+
+def convert_rows_to_cube_cobra(header: List[str], rows: Iterable[List[str]]) -> Iterable[List[str]]:
+    """Provide a stream of rows for a cube_cobra csv, converting each csv row of values as it is read."""
+    yield CUBE_COBRA_HEADER
+    plan = Cube(header)
+    for values in rows:
+        row = convert_values(plan, values)
+        if row is not None:
+            yield row
+
+
+def convert_to_cube_cobra(entries: Iterable[OrderedDict]) -> Iterable[List[str]]:
+    """Provide a stream of rows for a cube_cobra csv corresponding to the same entries."""
+    entries = iter(entries)
+    first = next(entries, None)
+    if first is None:
+        return convert_rows_to_cube_cobra([], ())
+    # csv.DictReader fills the missing fields of short rows with None
+    rows = (['' if value is None else value for value in entry.values()] for entry in chain([first], entries))
+    return convert_rows_to_cube_cobra(list(first), rows)
+
+
+def convert_file_to_cube_cobra(filename: str) -> Iterable[List[str]]:
+    """Provide a stream of rows for a cube_cobra csv, reading the csv file a row at a time."""
+    with open(filename, newline='') as csv_file:
+        reader = csv.reader(csv_file)
+        yield from convert_rows_to_cube_cobra(next(reader, []), reader)
+
+
+def convert_cube_to_cube_cobra(cube: Cube) -> Iterable[List[str]]:
+    """Provide a stream of rows for a cube_cobra csv with every card of cube, reading one card at a time."""
+    yield CUBE_COBRA_HEADER
+    for i in range(len(cube)):
+        yield cube_cobra_row(cube.values(i), cube.rarity[i], cube.flags[i], cube.tags_of(i))
+
+
+def split_tags(entry: OrderedDict) -> Tuple[Dict[str, Union[str, int]], List[str]]:
+    """Convert a CubeCobra entry to its Google Sheets special columns and its plain tags."""
+    data: Dict[str, Union[str, int]] = dict()
+    data["Card Name"] = entry["Name"]
+    data["Colors"] = entry["Color"]
+    data["Set"] = entry["Set"].upper()
+    data["Collector Number"] = entry["Collector Number"]
+    data['Type Line'] = entry["Type"]
+    data['Image URL'] = entry["Image URL"]
+    if entry['Finish'] == 'Foil':
+        data['Foil'] = 1
+    else:
+        data['Foil'] = 0
+    if entry['Status'] == 'Premium Owned':
+        data['Have Copy'] = 1
+        data['Premium'] = 1
+    else:
+        if entry['Status'] == 'Owned':
+            data['Have Copy'] = 1
         else:
-            finish = "Non-foil"
-        rarity = entry.get('Rarity', None)
-        if rarity.endswith('-C'):
-            maybe = 'true'
-            rarity = rarity[:-2]
+            data['Have Copy'] = 0
+        data['Premium'] = 0
+    plain_tags = []
+    tags = entry["Tags"].split(",")
+    for tag in tags:
+        tag = tag.strip()
+        if tag.startswith(RATING_PREFIX):
+            data["Rating"] = tag[len(RATING_PREFIX) + 1:]
+        elif tag in REVERSE_RARITY_MAP:
+            rarity = REVERSE_RARITY_MAP[tag]
+            if entry['Maybeboard'] == 'true':
+                rarity += '-C'
+            data['Rarity'] = rarity
+        elif tag.startswith(POWER_PREFIX):
+            data["Power"] = tag[len(POWER_PREFIX) + 1:]
+        elif tag.startswith(TOUGHNESS_PREFIX):
+            data["Toughness"] = tag[len(TOUGHNESS_PREFIX) + 1:]
+        elif tag.startswith(COLORS_PREFIX):
+            data["Colors"] = tag[len(COLORS_PREFIX) + 1:]
+        elif tag.startswith(CMC_PREFIX):
+            data['CMC'] = tag[len(CMC_PREFIX) + 1:]
         else:
-            maybe = 'false'
-        rarity = RARITY_MAP.get(rarity, 'No Rarity')
-        tags = [rarity, f'{COLORS_PREFIX}-{entry["Colors"]}', f'{CMC_PREFIX}-{cmc}']
-        if len(entry["Power"]) > 0:
-            tags.append(f'{POWER_PREFIX}-{entry["Power"]}')
-        if len(entry["Toughness"]) > 0:
-            tags.append(f'{TOUGHNESS_PREFIX}-{entry["Toughness"]}')
-        if len(entry["Rating"]) > 0:
-            tags.append(f'{RATING_PREFIX}-{entry["Rating"]}')
-        for column, value in entry.items():
-            if column not in SPECIAL_COLUMNS:
-                try:
-                    if value == '1':
-                        tags.append(column)
-                except ValueError:
-                    pass
-        tags_str = ",  ".join(tag.strip() for tag in tags)
-        line = f'"{name}",{cmc},{type_line},{color},{card_set},{collector_number},{status},{finish},{maybe},{imgUrl},"{tags_str}"'  # noqa: E501
-        print(line)
-        yield line
-
-
-def convert_to_sheets(entries: Iterable[OrderedDict]) -> Iterable[str]:
-    """Provide a stream of lines for a cube_cobra csv corresponding to the same entries."""
+            if tag in SPECIAL_COLUMNS:
+                data[tag] = 1
+            plain_tags.append(tag)
+    return data, plain_tags
+
+
+def is_plain_tag(tag: str) -> bool:
+    """Whether a CubeCobra tag becomes its own column in Google Sheets."""
+    return not (tag.startswith((RATING_PREFIX, POWER_PREFIX, TOUGHNESS_PREFIX, COLORS_PREFIX, CMC_PREFIX))
+                or tag in REVERSE_RARITY_MAP)
+
+
+def scan_tags(entries: Iterable[OrderedDict]) -> Set[str]:
+    """Collect the plain tags used by entries, looking only at the Tags column."""
     all_tags: Set[str] = set()
-    converted_data: List[Dict[str, Union[str, int]]] = []
     for entry in entries:
-        data: Dict[str, Union[str, int]] = dict()
-        data["Card Name"] = f'"{entry["Name"]}"'
-        data["Colors"] = entry["Color"]
-        data["Set"] = f'"{entry["Set"].upper()}"'
-        data["Collector Number"] = entry["Collector Number"]
-        data['Type Line'] = f'"{entry["Type"]}"'
-        data['Image URL'] = f'"{entry["Image URL"]}"'
-        if entry['Finish'] == 'Foil':
-            data['Foil'] = 1
+        for tag in entry["Tags"].split(","):
+            tag = tag.strip()
+            if is_plain_tag(tag):
+                all_tags.add(tag)
+    return all_tags
+
+
+def convert_to_sheets(entries: Iterable[OrderedDict], all_tags: Optional[Set[str]] = None
+                      ) -> Iterable[List[Union[str, int]]]:
+    """
+    Provide a stream of rows for a Google Sheets csv corresponding to the same entries.
+
+    If all_tags is given (see scan_tags) every row is written as soon as it is converted.
+    Otherwise the converted rows are kept, with their tags as column indices, until the
+    last entry has been seen and the header can be written.
+    """
+    stream = all_tags is not None
+    tag_index: Dict[str, int] = {tag: i for i, tag in enumerate(sorted(all_tags or ()))}
+    converted_data: List[Tuple[Dict[str, Union[str, int]], List[int]]] = []
+
+    def expand(data: Dict[str, Union[str, int]], indices: List[int]) -> List[Union[str, int]]:
+        tag_values: List[Union[str, int]] = [0] * len(tag_index)
+        for index in indices:
+            tag_values[index] = 1
+        return [data.get(column, "") for column in SPECIAL_COLUMNS] + tag_values
+
+    if stream:
+        yield SPECIAL_COLUMNS + sorted(tag_index)
+    for entry in entries:
+        data, tags = split_tags(entry)
+        if stream:
+            missing = [tag for tag in tags if tag not in tag_index]
+            if missing:
+                raise ValueError(f"Tags {missing} are not in all_tags")
+            yield expand(data, [tag_index[tag] for tag in tags])
         else:
-            data['Foil'] = 0
-        if entry['Status'] == 'Premium Owned':
-            data['Have Copy'] = 1
-            data['Premium'] = 1
+            converted_data.append((data, [tag_index.setdefault(tag, len(tag_index)) for tag in tags]))
+    if stream:
+        return
+    # Renumber the tags in column order
+    columns = sorted(tag_index)
+    order = {tag_index[tag]: i for i, tag in enumerate(columns)}
+    tag_index = {tag: i for i, tag in enumerate(columns)}
+    yield SPECIAL_COLUMNS + columns
+    for data, indices in converted_data:
+        yield expand(data, [order[index] for index in indices])
+
+
+def chunk_offsets(filename: str, chunks: int) -> Tuple[int, List[Tuple[int, int]]]:
+    """
+    Split a csv file into about chunks byte ranges that each start and end on a row boundary.
+
+    Returns the offset where the header row ends and the (start, end) of each range. Newlines
+    inside quoted fields are skipped by tracking whether an even number of quotes precede them.
+    """
+    with open(filename, 'rb') as csv_file:
+        data = mmap.mmap(csv_file.fileno(), 0, access=mmap.ACCESS_READ) if os.path.getsize(filename) else b''
+        size = len(data)
+
+        def next_boundary(pos: int, quotes: int) -> Tuple[int, int]:
+            """Return the offset after the first unquoted newline at or after pos and the quote count there."""
+            while True:
+                newline = data.find(b'\n', pos)
+                if newline == -1:
+                    return size, quotes
+                quotes += data[pos:newline].count(b'"')
+                if quotes % 2 == 0:
+                    return newline + 1, quotes
+                pos = newline + 1
+
+        header_end, quotes = next_boundary(0, 0)
+        ranges = []
+        start = header_end
+        for i in range(1, chunks + 1):
+            target = max(header_end + (size - header_end) * i // chunks, start)
+            quotes += data[start:target].count(b'"')
+            end, quotes = next_boundary(target, quotes) if target < size else (size, quotes)
+            if end > start:
+                ranges.append((start, end))
+            start = end
+        return header_end, ranges
+
+
+def convert_chunk(task: Tuple[str, int, int, List[str], bool, Optional[Set[str]]]) -> List[List]:
+    """Convert the rows in one byte range of a csv file, without the header row."""
+    filename, start, end, fieldnames, to_cube_cobra, all_tags = task
+    with open(filename, 'rb') as csv_file:
+        csv_file.seek(start)
+        text = io.TextIOWrapper(io.BytesIO(csv_file.read(end - start)), newline='')
+        if to_cube_cobra:
+            # The same path as the serial conversion, so short rows are handled the same way
+            rows = convert_rows_to_cube_cobra(fieldnames, csv.reader(text))
         else:
-            if entry['Status'] == 'Owned':
-                data['Have Copy'] = 1
+            rows = convert_to_sheets(csv.DictReader(text, fieldnames=fieldnames), all_tags=all_tags)
+        return list(islice(rows, 1, None))
+
+
+def convert_parallel(input_file: str, jobs: int, to_cube_cobra: bool, all_tags: Optional[Set[str]] = None
+                     ) -> Iterable[List]:
+    """
+    Convert input_file in byte range chunks on a pool of jobs processes, yielding rows in input order.
+
+    all_tags is required when converting to Google Sheets.
+    """
+    header_end, ranges = chunk_offsets(input_file, jobs * 4)
+    with open(input_file, newline='') as csv_file:
+        fieldnames = next(csv.reader(csv_file), [])
+    if to_cube_cobra:
+        yield from islice(convert_to_cube_cobra(()), 1)
+    else:
+        yield from islice(convert_to_sheets((), all_tags=all_tags), 1)
+    tasks = [(input_file, start, end, fieldnames, to_cube_cobra, all_tags) for start, end in ranges]
+    with ProcessPoolExecutor(max_workers=jobs) as pool:
+        for rows in pool.map(convert_chunk, tasks):
+            yield from rows
+
+
+def format_row(row: List) -> str:
+    """Encode one row the way write_rows does, without the line terminator."""
+    line = io.StringIO()
+    # With an empty lineterminator fields containing newlines would not be quoted
+    csv.writer(line, lineterminator='\n').writerow(row)
+    return line.getvalue()[:-1]
+
+
+def iter_records(csv_file: BinaryIO) -> Iterable[bytes]:
+    """Yield each record of a csv file opened in binary mode as its raw bytes, keeping quoted newlines inside."""
+    pending = b''
+    for line in csv_file:
+        pending = pending + line if pending else line
+        if pending.count(b'"') % 2 == 0:
+            yield pending
+            pending = b''
+    if pending:
+        yield pending
+
+
+def parse_record(record: bytes) -> List[str]:
+    return next(csv.reader(io.StringIO(record.decode(), newline='')), [])
+
+
+def convert_incremental(input_file: str, output_file: str, diff_file: Optional[str] = None,
+                        verbose: bool = False) -> Tuple[int, int, int]:
+    """
+    Convert input_file to CubeCobra, reusing output lines of entries unchanged since the last run.
+
+    A manifest next to output_file keeps each entry's key (card name, set and collector
+    number), a hash of its raw input record and the length of its line in output_file. Only the
+    entries whose hash changed are converted. The new output is patched together from those
+    lines and runs of unchanged lines copied from the previous output by offset, and nothing
+    is written if every entry is unchanged and in the same order. If diff_file is given the
+    added, changed and removed cards are written to it. Everything is converted when there
+    is no usable manifest, the input columns changed or output_file's size or modification
+    time differ from when the manifest was written. Returns the number of added, changed
+    and removed entries.
+    """
+    manifest_file = output_file + '.manifest'
+    header_line = (format_row(CUBE_COBRA_HEADER) + '\n').encode()
+    with open(input_file, 'rb') as inp:
+        records = iter_records(inp)
+        header = parse_record(next(records, b''))
+        # Previous key -> (hash, offset, length of its line in the previous output)
+        previous: Dict[str, Tuple[str, int, int]] = {}
+        previous_keys: List[str] = []
+        if os.path.exists(manifest_file) and os.path.exists(output_file):
+            with open(manifest_file) as manifest_inp:
+                manifest = json.load(manifest_inp)
+            # The offsets are only valid for the output the manifest was written with
+            if manifest['header'] == header and manifest.get('output') == csv_source(output_file):
+                previous_keys = manifest['keys']
+                offsets = accumulate(manifest['lengths'], initial=len(header_line))
+                previous = dict(zip(previous_keys, zip(manifest['hashes'], offsets, manifest['lengths'])))
+
+        plan = Cube(header)
+        key_cols = [plan.header.index(column) for column in ('Card Name', 'Set', 'Collector Number')]
+        last_col = max(key_cols)
+        keys: List[str] = []
+        hashes: List[str] = []
+        lengths: List[int] = []
+        # Runs of the new output, as [offset, length] in the previous output or the bytes of new lines
+        pieces: List[Union[List[int], bytes]] = []
+        changes: List[Tuple[str, str]] = []
+        seen: Dict[str, int] = {}
+        for record in records:
+            record = record.rstrip(b'\r\n')
+            # Only records with a quote before the key columns need the csv parser to find the key
+            quote = record.find(b'"')
+            if quote == -1 or record.count(b',', 0, quote) > last_col:
+                values = None
+                fields = record.split(b',', last_col + 1)
+                fields = [fields[col].decode() if col < len(fields) else '' for col in key_cols]
             else:
-                data['Have Copy'] = 0
-            data['Premium'] = 0
-        tags = entry["Tags"].split(",")
-        for tag in tags:
-            tag = tag.strip()
-            if tag.startswith(RATING_PREFIX):
-                data["Rating"] = tag[len(RATING_PREFIX) + 1:]
-            elif tag in REVERSE_RARITY_MAP:
-                rarity = REVERSE_RARITY_MAP[tag]
-                if entry['Maybeboard'] == 'true':
-                    rarity += '-C'
-                data['Rarity'] = rarity
-            elif tag.startswith(POWER_PREFIX):
-                data["Power"] = tag[len(POWER_PREFIX) + 1:]
-            elif tag.startswith(TOUGHNESS_PREFIX):
-                data["Toughness"] = tag[len(TOUGHNESS_PREFIX) + 1:]
-            elif tag.startswith(COLORS_PREFIX):
-                data["Colors"] = tag[len(COLORS_PREFIX) + 1:]
-            elif tag.startswith(CMC_PREFIX):
-                data['CMC'] = tag[len(CMC_PREFIX) + 1:]
+                values = parse_record(record)
+                fields = [values[col] if col < len(values) else '' for col in key_cols]
+            if len(fields[0]) == 0:
+                continue
+            key = '|'.join(fields)
+            seen[key] = seen.get(key, 0) + 1
+            key = f'{key}|{seen[key]}'
+            entry_hash = hashlib.blake2b(record, digest_size=12).hexdigest()
+            old_hash, offset, length = previous.pop(key, (None, 0, 0))
+            if old_hash == entry_hash:
+                last = pieces[-1] if pieces else None
+                if isinstance(last, list) and last[0] + last[1] == offset:
+                    last[1] += length
+                else:
+                    pieces.append([offset, length])
             else:
-                if tag not in all_tags:
-                    all_tags.add(tag)
-                data[tag] = 1
-        converted_data.append(data)
-    columns = SPECIAL_COLUMNS + sorted(all_tags)
-    columns_line = ",".join(f'"{column}"' for column in columns)
-    print(columns_line)
-    yield columns_line
-    for converted_entry in converted_data:
-        data = {key: "" for key in SPECIAL_COLUMNS}
-        data.update({key: 0 for key in all_tags})
-        data.update(converted_entry)
-        line = ",".join(str(data[column]) for column in columns)
-        print(line)
-        yield line
-
-
-def main(input_file: str, output_file: str, to_cube_cobra: bool = False, to_google_sheets: bool = False) -> int:
+                line = format_row(convert_values(plan, values if values is not None else parse_record(record)))
+                encoded = (line + '\n').encode()
+                length = len(encoded)
+                pieces.append(encoded)
+                changes.append(('Added' if old_hash is None else 'Changed', line))
+            keys.append(key)
+            hashes.append(entry_hash)
+            lengths.append(length)
+    removed = list(previous.values())
+
+    # Nothing to write if every entry is unchanged and in the same order
+    if changes or removed or keys != previous_keys:
+        with open(output_file, 'rb') if previous_keys else contextlib.nullcontext() as old:
+            data = mmap.mmap(old.fileno(), 0, access=mmap.ACCESS_READ) if old is not None else b''
+            changes += [('Removed', bytes(data[offset:offset + length - 1]).decode()) for _, offset, length in removed]
+            # Write beside the previous output, which is still being read
+            temporary = f'{output_file}.{os.getpid()}.tmp'
+            with open(temporary, 'wb') as out_file:
+                out_file.write(header_line)
+                for piece in pieces:
+                    out_file.write(data[piece[0]:piece[0] + piece[1]] if isinstance(piece, list) else piece)
+            if old is not None:
+                data.close()
+        os.replace(temporary, output_file)
+        with open(manifest_file, 'w') as out:
+            out.write(json.dumps({'header': header, 'keys': keys, 'hashes': hashes, 'lengths': lengths,
+                                  'output': csv_source(output_file)}))
+    if verbose:
+        for change, line in changes:
+            print(f'{change}: {line}')
+    if diff_file is not None:
+        with open(diff_file, 'w', newline='') as out:
+            for change, line in changes:
+                out.write(f'{change},{line}\n')
+    counts = Counter(change for change, _ in changes)
+    return counts['Added'], counts['Changed'], counts['Removed']
+
+
+def write_rows(rows: Iterable[List], output_file: str, verbose: bool = False) -> int:
+    """Write rows to output_file as they are produced, echoing them to stdout if verbose."""
+    count = 0
+    with open(output_file, 'w', newline='', buffering=1 << 16) as out_file:
+        writer = csv.writer(out_file, lineterminator='\n')
+        echo = csv.writer(sys.stdout, lineterminator='\n') if verbose else None
+        for row in rows:
+            writer.writerow(row)
+            if echo is not None:
+                echo.writerow(row)
+            count += 1
+    return count
+
+
+def main(input_file: str, output_file: str, to_cube_cobra: bool = False, to_google_sheets: bool = False,
+         verbose: bool = False, jobs: int = 1, incremental: bool = False, diff_file: Optional[str] = None) -> int:
     """Convert the csv file specified by filename."""
     entries = read_file(input_file)
+    if incremental or diff_file:
+        if not to_cube_cobra:
+            raise Exception("Incremental conversion is only supported with --to-cube-cobra")
+        added, changed, removed = convert_incremental(input_file, output_file, diff_file, verbose)
+        print(f"{added} added, {changed} changed, {removed} removed")
+        return 0
     if to_cube_cobra:
-        output = convert_to_cube_cobra(entries)
+        if jobs > 1:
+            output = convert_parallel(input_file, jobs, True)
+        else:
+            cube = current_snapshot(input_file)
+            output = convert_file_to_cube_cobra(input_file) if cube is None else convert_cube_to_cube_cobra(cube)
     elif to_google_sheets:
-        output = convert_to_sheets(entries)
+        all_tags = scan_tags(read_file(input_file))
+        if jobs > 1:
+            output = convert_parallel(input_file, jobs, False, all_tags)
+        else:
+            output = convert_to_sheets(entries, all_tags=all_tags)
     else:
         raise Exception("Must specify cube_cobra or google_sheets")
-    with open(output_file, 'w') as out_file:
-        out_file.write('\n'.join(output))
+    write_rows(output, output_file, verbose)
     return 0
 
 
@@ -162,4 +462,10 @@ if __name__ == "__main__":
     group.add_argument('--to-google-sheets', action='store_true', help="Export to Google Sheets format for csv.")
     parser.add_argument('--input-file', type=str, help="The file to import/export from.", required=True)
     parser.add_argument('--output-file', type=str, help="The file to import/export to.", required=True)
+    parser.add_argument('--verbose', action='store_true', help="Echo each converted row to stdout.")
+    parser.add_argument('--jobs', type=int, default=1, help="Convert chunks of the file on this many processes.")
+    parser.add_argument('--incremental', action='store_true',
+                        help="Only reconvert cards changed since the last run (--to-cube-cobra only).")
+    parser.add_argument('--diff-file', type=str, help="Write the cards added, changed or removed since the last "
+                                                     "incremental run to this csv. Implies --incremental.")
     sys.exit(main(**vars(parser.parse_args())))
@@ -1,13 +1,37 @@
 #!/usr/bin/env python3
+import argparse
+import ast
+import atexit
+import bisect
+import gzip
+import http.client
+import json
 import logging
-import pickle
 import os
-import urllib.request
+import pickle
+import sqlite3
+import sys
+import threading
+import time
+import urllib.error
+import urllib.parse
+import zlib
 
 from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from itertools import chain
+
+import lxml.html
+from bs4 import BeautifulSoup, UnicodeDammit
+from lxml import etree
 
-from bs4 import BeautifulSoup
-# Future Work. Support looking up without mvid number, Fix split cards, CMC extraction, Type Extraction
+from name_index import NameIndex
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+# Future Work. Fix split cards, CMC extraction, Type Extraction
 
 
 def split_and_cut(s, txt, ind, *args):
@@ -37,55 +61,420 @@ def split_and_cut(s, txt, ind, *args):
 colors = ['White', 'Blue', 'Black', 'Red', 'Green', 'Colorless']
 
 
-def disk_cache(cache_file):
+class ColorMask(int):
+    """
+    Color identity as a 6 bit mask with one bit per entry of colors (WUBRG and Colorless).
+
+    Behaves like a frozenset of color names for membership, iteration and len, and has the
+    set operators and methods, which accept masks, color names or iterables of them and
+    return a ColorMask. Equality, ordering and hashing are those of the int, so compare with
+    a set of names through set(mask), issubset or issuperset. Its string form is the space
+    separated names in WUBRG order.
+    """
+    __slots__ = ()
+    BITS = {color: 1 << i for i, color in enumerate(colors)}
+
+    def __new__(cls, value=0):
+        if isinstance(value, str):
+            value = value.split()
+        if value is None:
+            value = 0
+        if not isinstance(value, int):
+            mask = 0
+            for color in value:
+                mask |= cls.BITS[color]
+            value = mask
+        return super().__new__(cls, value)
+
+    @classmethod
+    def bits(cls, value):
+        """Return the plain int mask of anything ColorMask accepts."""
+        return int(value if isinstance(value, int) else cls(value))
+
+    def __contains__(self, color):
+        return bool(int(self) & self.BITS.get(color, 0))
+
+    def __iter__(self):
+        return (color for color in colors if int(self) & self.BITS[color])
+
+    def __len__(self):
+        return bin(self).count('1')
+
+    def __str__(self):
+        return ' '.join(self)
+
+    def __repr__(self):
+        return 'ColorMask({!r})'.format(str(self))
+
+    def __or__(self, other):
+        return ColorMask(int(self) | self.bits(other))
+
+    def __and__(self, other):
+        return ColorMask(int(self) & self.bits(other))
+
+    def __xor__(self, other):
+        return ColorMask(int(self) ^ self.bits(other))
+
+    def __sub__(self, other):
+        return ColorMask(int(self) & ~self.bits(other))
+
+    __ror__ = __or__
+    __rand__ = __and__
+    __rxor__ = __xor__
+
+    def __rsub__(self, other):
+        return ColorMask(self.bits(other) & ~int(self))
+
+    def union(self, *others):
+        res = self
+        for other in others:
+            res |= other
+        return res
+
+    def intersection(self, *others):
+        res = self
+        for other in others:
+            res &= other
+        return res
+
+    def difference(self, *others):
+        res = self
+        for other in others:
+            res -= other
+        return res
+
+    def symmetric_difference(self, other):
+        return self ^ other
+
+    def isdisjoint(self, other):
+        return not int(self) & self.bits(other)
+
+    def issubset(self, other):
+        return not int(self) & ~self.bits(other)
+
+    def issuperset(self, other):
+        other = self.bits(other)
+        return int(self) & other == other
+
+
+MISSING = object()
+
+# Set through enable_profiling. Counters are always kept, timing each field extraction
+# and logging every event only happen when these are on.
+PROFILE = False
+LOG_EVENTS = False
+stats_log = logging.getLogger('gatherer.stats')
+
+
+def enable_profiling(profile=True, log_events=False):
+    """
+    Time each field extraction when profile is set and, when log_events is set, log every
+    fetch, cache miss and extraction failure as a json message on the gatherer.stats logger.
+    """
+    global PROFILE, LOG_EVENTS
+    PROFILE = profile
+    LOG_EVENTS = log_events
+
+
+def log_event(event, **fields):
+    if LOG_EVENTS:
+        stats_log.info(json.dumps(dict(event=event, **fields), default=str))
+
+
+class Histogram:
+    """
+    Counts of durations in fixed millisecond buckets, with totals for the mean.
+    """
+    BOUNDS_MS = (1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 2000, 5000, 10000)
+
+    def __init__(self):
+        self.counts = [0] * (len(self.BOUNDS_MS) + 1)
+        self.count = 0
+        self.seconds = 0.0
+
+    def add(self, seconds):
+        self.counts[bisect.bisect_left(self.BOUNDS_MS, seconds * 1000)] += 1
+        self.count += 1
+        self.seconds += seconds
+
+    def percentile(self, p):
+        """Return the upper bound in milliseconds of the bucket holding the p-th percentile."""
+        if not self.count:
+            return 0
+        rank = p / 100 * self.count
+        seen = 0
+        for bound, count in zip(self.BOUNDS_MS + (float('inf'),), self.counts):
+            seen += count
+            if seen >= rank:
+                return bound
+        return float('inf')
+
+    def as_dict(self):
+        labels = ['<={}ms'.format(bound) for bound in self.BOUNDS_MS] + ['>{}ms'.format(self.BOUNDS_MS[-1])]
+        return {'count': self.count, 'seconds': self.seconds,
+                'p50_ms': self.percentile(50), 'p95_ms': self.percentile(95),
+                'buckets': {label: count for label, count in zip(labels, self.counts) if count}}
+
+
+# field -> Histogram of extraction times, only filled while PROFILE is on
+field_times = {}
+# field -> number of pages whose extractor raised
+extraction_failures = Counter()
+_stats_lock = threading.Lock()
+
+
+def record_field(field, seconds):
+    with _stats_lock:
+        field_times.setdefault(field, Histogram()).add(seconds)
+
+
+class CacheStore:
+    """
+    Persistent key/value store behind disk_cache, kept in an SQLite file.
+
+    Each miss only writes its own entry, committed in batches of flush_every writes, and
+    None results are stored like any other value. The file is opened on first use and
+    entries are read one at a time, so a large cache costs nothing to import. Entries older
+    than ttl seconds are treated as misses, and once the store holds more than max_entries
+    the least recently used ones are dropped on flush. Small named memos can be attached
+    to an entry, in their own table so adding one does not rewrite the entry, and are
+    dropped when the entry's value changes. Hits (negative ones, of stored None, counted
+    separately too), misses, expired entries, writes and the time spent writing and
+    committing are kept in stats.
+    """
+
+    def __init__(self, cache_file, ttl=None, max_entries=None, flush_every=64):
+        self.cache_file = cache_file
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.flush_every = flush_every
+        self._conn = None
+        self._pending = 0
+        self._lock = threading.RLock()
+        self.stats = Counter()
+
+    def _connect(self):
+        if self._conn is None:
+            self._conn = sqlite3.connect(self.cache_file, check_same_thread=False)
+            self._conn.execute('CREATE TABLE IF NOT EXISTS entries ('
+                               'key TEXT PRIMARY KEY, value BLOB, stored REAL, accessed REAL)')
+            self._conn.execute('CREATE INDEX IF NOT EXISTS entries_stored ON entries (stored)')
+            self._conn.execute('CREATE TABLE IF NOT EXISTS memos ('
+                               'key TEXT, name TEXT, value BLOB, PRIMARY KEY (key, name))')
+            atexit.register(self.flush)
+        return self._conn
+
+    def _row(self, key):
+        return self._connect().execute('SELECT value, stored FROM entries WHERE key = ?',
+                                       (repr(key),)).fetchone()
+
+    def _wrote(self):
+        self._pending += 1
+        if self._pending >= self.flush_every:
+            self.flush()
+
+    def get(self, key, default=MISSING):
+        """
+        Return the value stored for key, or default if it is missing or has expired.
+        """
+        with self._lock:
+            row = self._row(key)
+            if row is None:
+                self.stats['misses'] += 1
+                log_event('cache_miss', cache=self.cache_file, key=repr(key))
+                return default
+            value, stored = row
+            now = time.time()
+            if self.ttl is not None and now - stored > self.ttl:
+                self.stats['misses'] += 1
+                self.stats['expired'] += 1
+                log_event('cache_miss', cache=self.cache_file, key=repr(key), expired=True)
+                return default
+            if self.max_entries is not None:
+                self._conn.execute('UPDATE entries SET accessed = ? WHERE key = ?', (now, repr(key)))
+                self._wrote()
+            value = pickle.loads(value)
+            self.stats['hits'] += 1
+            if value is None:
+                self.stats['negative_hits'] += 1
+            return value
+
+    def get_stale(self, key, default=MISSING):
+        """
+        Return the value stored for key even if it has expired.
+        """
+        with self._lock:
+            row = self._row(key)
+            if row is None:
+                return default
+            return pickle.loads(row[0])
+
+    def set(self, key, value):
+        with self._lock:
+            start = time.perf_counter()
+            now = time.time()
+            data = pickle.dumps(value, pickle.HIGHEST_PROTOCOL)
+            old = self._row(key)
+            if old is not None and old[0] != data:
+                self._conn.execute('DELETE FROM memos WHERE key = ?', (repr(key),))
+            self._conn.execute('INSERT OR REPLACE INTO entries VALUES (?, ?, ?, ?)', (repr(key), data, now, now))
+            self._wrote()
+            self.stats['writes'] += 1
+            if value is None:
+                self.stats['negative_writes'] += 1
+            self.stats['write_seconds'] += time.perf_counter() - start
+
+    def memos(self, key):
+        """
+        Return a dict of the memos attached to the entry for key.
+        """
+        with self._lock:
+            rows = self._connect().execute('SELECT name, value FROM memos WHERE key = ?', (repr(key),)).fetchall()
+        return {name: pickle.loads(value) for name, value in rows}
+
+    def set_memo(self, key, name, value):
+        """
+        Attach a memo to the entry for key, if there is one, without rewriting the entry.
+        """
+        with self._lock:
+            start = time.perf_counter()
+            self._connect().execute('INSERT OR REPLACE INTO memos SELECT ?, ?, ? '
+                                    'WHERE EXISTS (SELECT 1 FROM entries WHERE key = ?)',
+                                    (repr(key), name, pickle.dumps(value, pickle.HIGHEST_PROTOCOL), repr(key)))
+            self._wrote()
+            self.stats['memo_writes'] += 1
+            self.stats['write_seconds'] += time.perf_counter() - start
+
+    def items_since(self, since=0.0, batch=64):
+        """
+        Iterate over the (stored, key, value) of entries stored after since, oldest first, ignoring expiry.
+
+        Rows are read batch at a time through a cursor, so only one batch is in memory.
+        """
+        with self._lock:
+            cursor = self._connect().execute('SELECT stored, key, value FROM entries WHERE stored > ? '
+                                             'ORDER BY stored', (since,))
+        while True:
+            with self._lock:
+                rows = cursor.fetchmany(batch)
+            if not rows:
+                return
+            for stored, key, value in rows:
+                yield stored, ast.literal_eval(key), pickle.loads(value)
+
+    def items(self):
+        """
+        Iterate over the stored (key, value) pairs, ignoring expiry.
+        """
+        for _, key, value in self.items_since():
+            yield key, value
+
+    def __len__(self):
+        with self._lock:
+            return self._connect().execute('SELECT COUNT(*) FROM entries').fetchone()[0]
+
+    def flush(self):
+        """
+        Commit pending writes and evict least recently used entries over max_entries.
+        """
+        with self._lock:
+            if self._conn is None:
+                return
+            start = time.perf_counter()
+            if self.max_entries is not None:
+                self._conn.execute('DELETE FROM entries WHERE key IN (SELECT key FROM entries '
+                                   'ORDER BY accessed DESC LIMIT -1 OFFSET ?)', (self.max_entries,))
+                self._conn.execute('DELETE FROM memos WHERE key NOT IN (SELECT key FROM entries)')
+            self._conn.commit()
+            self._pending = 0
+            self.stats['flushes'] += 1
+            self.stats['flush_seconds'] += time.perf_counter() - start
+
+
+caches = []
+
+
+def disk_cache(cache_file, ttl=None, max_entries=None, flush_every=64):
     def dec(fun):
-        cache = {}
-        if os.path.exists(cache_file):
-            with open(cache_file, 'rb') as inp:
-                cache = pickle.load(inp)
+        cache = CacheStore(cache_file, ttl=ttl, max_entries=max_entries, flush_every=flush_every)
+        caches.append(cache)
 
-        def f(*args):
-            res = cache.get(tuple(args), None)
-            if res is not None:
-                return res
+        def refresh(*args):
             res = fun(*args)
-            cache[tuple(args)] = res
-            with open(cache_file, 'wb') as inp:
-                pickle.dump(cache, inp)
+            cache.set(tuple(args), res)
             return res
+
+        def f(*args):
+            res = cache.get(tuple(args))
+            if res is not MISSING:
+                return res
+            return refresh(*args)
+        f.cache = cache
+        # Recompute and store without looking in the cache first, for callers that just missed
+        f.refresh = refresh
         return f
     return dec
 
 
 class CardInfo:
+    """
+    Immutable record of a single printing of a card.
+
+    List arguments are stored as tuples so instances can be hashed, the color identity as a
+    ColorMask, and the string form is computed once on first use.
+    """
+    FIELDS = ('name', 'cost', 'text', 'flavor_text', 'supertypes', 'types', 'subtypes',
+              'image_link', 'power', 'toughness', 'printing', 'rarity', 'artist',
+              'color_identity', 'other_printings', 'number')
+    __slots__ = FIELDS + ('_str',)
+
     def __init__(self, name='Unknown', cost='Unknown', text='', flavor_text='',
-                 supertypes=[], types=[], subtypes=[], image_link='',
+                 supertypes=(), types=(), subtypes=(), image_link='',
                  power='', toughness='', printing='UNK', rarity='Unknown',
-                 artist='Unknown', color_identity='', other_printings=[],
+                 artist='Unknown', color_identity='', other_printings=(),
                  number=-1):
-        self.name = name
-        self.cost = cost
-        self.text = text
-        self.flavor_text = flavor_text
-        self.supertypes = supertypes
-        self.types = types
-        self.subtypes = subtypes
-        self.image_link = image_link
-        self.power = power
-        self.toughness = toughness
-        self.printing = printing
-        self.rarity = rarity
-        self.artist = artist
-        self.color_identity = color_identity
-        self.other_printings = other_printings
-        self.number = number
+        values = (name, cost, text, flavor_text, supertypes, types, subtypes, image_link,
+                  power, toughness, printing, rarity, artist, color_identity, other_printings,
+                  number)
+        for field, value in zip(self.FIELDS, values):
+            if isinstance(value, list):
+                value = tuple(value)
+            object.__setattr__(self, field, value)
+        object.__setattr__(self, 'color_identity', ColorMask(color_identity))
+        object.__setattr__(self, '_str', None)
+
+    def __setattr__(self, name, value):
+        raise AttributeError("CardInfo is immutable")
+
+    def __delattr__(self, name):
+        raise AttributeError("CardInfo is immutable")
+
+    def _values(self):
+        return tuple(getattr(self, field) for field in self.FIELDS)
+
+    def __eq__(self, other):
+        if not isinstance(other, CardInfo):
+            return NotImplemented
+        return self._values() == other._values()
+
+    def __hash__(self):
+        return hash(self._values())
+
+    def __reduce__(self):
+        return CardInfo, self._values()
+
+    def __repr__(self):
+        return 'CardInfo({})'.format(', '.join('{}={!r}'.format(field, getattr(self, field))
+                                               for field in self.FIELDS))
 
     def __str__(self):
-        image_link = '<img src="{}">'.format(self.image_link)
-        fields = [self.name, self.cost, self.text, self.flavor_text,
-                  self.types, image_link, self.power,
-                  self.printing, self.rarity, self.artist, self.color_identity]
-        return ';'.join(['{}'.format(n.replace('\n', '<br>')) for n in fields])
+        if self._str is None:
+            image_link = '<img src="{}">'.format(self.image_link)
+            fields = [self.name, self.cost, self.text, self.flavor_text,
+                      self.types, image_link, self.power,
+                      self.printing, self.rarity, self.artist, self.color_identity]
+            object.__setattr__(self, '_str', ';'.join(['{}'.format(n).replace('\n', '<br>') for n in fields]))
+        return self._str
 
 
 def get_value_text(key, box='value'):
@@ -96,7 +485,7 @@ def get_value_text(key, box='value'):
     return fun
 
 
-def get_color_id_str(doc):
+def get_color_mask(doc):
     res = set()
     search_items = doc.find_all(**{'class': 'manaRow'})
     search_items += doc.find_all(**{'class': 'cardtextbox'})
@@ -110,7 +499,7 @@ def get_color_id_str(doc):
             for color in colors:
                 if color in possibles:
                     res.add(color)
-        return ' '.join(res)
+    return ColorMask(res)
 
 
 def get_other_printing_list(doc):
@@ -130,177 +519,937 @@ def get_image_link(doc):
     return 'https://gatherer.wizards.com' + search_item['src'][5:]
 
 
-@disk_cache('card.cache')
-def get_card(mvid):
-    r_url = 'http://gatherer.wizards.com/Pages/Card/Details.aspx?multiverseid={}'.format(mvid)
-    doc = None
-    req = urllib.request.urlopen(r_url)
-    doc = BeautifulSoup(req.read(), "lxml")
-    req.close()
-
-    # def CardInfo(self, name='Unknown', cost='Unknown', text='', flavor_text='',
-    #              supertypes=[], types=[], subtypes=[], image_link='',
-    #              power='', toughness='', printing='UNK', rarity='Unknown',
-    #              artist='Unknown', color_idenity='', other_printings=[]):
-    fields = {
-        'name': get_value_text('ctl00_ctl00_ctl00_MainContent_SubContent_SubContent_nameRow'),
-        # Eventually replace with a function to correctly read
-        'cost': 'ctl00_ctl00_ctl00_MainContent_SubContent_SubContent_manaRow',
-        'text': get_value_text('ctl00_ctl00_ctl00_MainContent_SubContent_SubContent_textRow'),
-        'flavor_text': get_value_text('ctl00_ctl00_ctl00_MainContent_SubContent_SubContent_FlavorText',
-                                      box='flavortextbox'),
-        # Eventually split into sub, super, regular
-        'types': get_value_text('ctl00_ctl00_ctl00_MainContent_SubContent_SubContent_typeRow'),
-        'image_link': get_image_link,
-        'power': get_value_text('ctl00_ctl00_ctl00_MainContent_SubContent_SubContent_ptRow'),
-        # Need to correctly parse out set name and maybe 3 letter code
-        'printing': get_value_text('ctl00_ctl00_ctl00_MainContent_SubContent_SubContent_setRow'),
-        'rarity': get_value_text('ctl00_ctl00_ctl00_MainContent_SubContent_SubContent_rarityRow'),
-        'artist': get_value_text('ctl00_ctl00_ctl00_MainContent_SubContent_SubContent_artistRow'),
-        'color_identity': get_color_id_str,
-        'other_printings': get_other_printing_list
-    }
-
-    kwargs = {}
-    for field, f in fields.items():
+DETAILS_URL = 'http://gatherer.wizards.com/Pages/Card/Details.aspx?multiverseid={}'
+
+CARD_FIELDS = {
+    'name': get_value_text('ctl00_ctl00_ctl00_MainContent_SubContent_SubContent_nameRow'),
+    # Eventually replace with a function to correctly read
+    'cost': 'ctl00_ctl00_ctl00_MainContent_SubContent_SubContent_manaRow',
+    'text': get_value_text('ctl00_ctl00_ctl00_MainContent_SubContent_SubContent_textRow'),
+    'flavor_text': get_value_text('ctl00_ctl00_ctl00_MainContent_SubContent_SubContent_FlavorText',
+                                  box='flavortextbox'),
+    # Eventually split into sub, super, regular
+    'types': get_value_text('ctl00_ctl00_ctl00_MainContent_SubContent_SubContent_typeRow'),
+    'image_link': get_image_link,
+    'power': get_value_text('ctl00_ctl00_ctl00_MainContent_SubContent_SubContent_ptRow'),
+    # Need to correctly parse out set name and maybe 3 letter code
+    'printing': get_value_text('ctl00_ctl00_ctl00_MainContent_SubContent_SubContent_setRow'),
+    'rarity': get_value_text('ctl00_ctl00_ctl00_MainContent_SubContent_SubContent_rarityRow'),
+    'artist': get_value_text('ctl00_ctl00_ctl00_MainContent_SubContent_SubContent_artistRow'),
+    'color_identity': get_color_mask,
+    'other_printings': get_other_printing_list
+}
+
+
+def extract_page_soup(body):
+    """
+    Extract the CardInfo keyword arguments and color identity mask from a details page with
+    BeautifulSoup and CARD_FIELDS, searching the whole document once per field.
+
+    Kept as the reference implementation for extract_page.
+    """
+    doc = BeautifulSoup(body, "lxml")
+    card = {}
+    for field, f in CARD_FIELDS.items():
         try:
-            kwargs[field] = f(doc)
+            card[field] = f(doc)
         except:
             pass
+    return card, card.get('color_identity', ColorMask())
+
 
-    if not kwargs:
+ROW_PREFIX = 'ctl00_ctl00_ctl00_MainContent_SubContent_SubContent_'
+# Every element extract_page needs, collected in a single walk of the document
+_page_nodes = etree.XPath("//*[starts-with(@id, $prefix)"
+                          " or contains(concat(' ', normalize-space(@class), ' '), ' manaRow ')"
+                          " or contains(concat(' ', normalize-space(@class), ' '), ' cardtextbox ')]")
+_class_nodes = etree.XPath(".//*[contains(concat(' ', normalize-space(@class), ' '), concat(' ', $cls, ' '))]")
+# field -> (row id suffix, class of the box holding the value)
+TEXT_FIELDS = {
+    'name': ('nameRow', 'value'),
+    'text': ('textRow', 'value'),
+    'flavor_text': ('FlavorText', 'flavortextbox'),
+    'types': ('typeRow', 'value'),
+    'power': ('ptRow', 'value'),
+    'printing': ('setRow', 'value'),
+    'rarity': ('rarityRow', 'value'),
+    'artist': ('artistRow', 'value'),
+}
+
+
+def _img_colors(node, mask):
+    for img in node.iterdescendants('img'):
+        possibles = img.get('alt')
+        if possibles is None:
+            continue
+        possibles = possibles.replace('Variable Colorless', '')
+        for color, bit in ColorMask.BITS.items():
+            if color in possibles:
+                mask |= bit
+    return mask
+
+
+def page_nodes(body):
+    """
+    Parse a details page and return its rows by id suffix, its manaRow elements and its
+    cardtextbox elements, all found in a single walk of the document.
+    """
+    if isinstance(body, bytes):
+        try:
+            body = body.decode('utf-8')
+        except UnicodeDecodeError:
+            body = UnicodeDammit(body).unicode_markup
+    doc = lxml.html.document_fromstring(body)
+    rows = {}
+    mana_rows = []
+    text_boxes = []
+    for node in _page_nodes(doc, prefix=ROW_PREFIX):
+        node_id = node.get('id')
+        if node_id is not None and node_id.startswith(ROW_PREFIX):
+            rows.setdefault(node_id[len(ROW_PREFIX):], node)
+        node_classes = (node.get('class') or '').split()
+        if 'manaRow' in node_classes:
+            mana_rows.append(node)
+        if 'cardtextbox' in node_classes:
+            text_boxes.append(node)
+    return rows, mana_rows, text_boxes
+
+
+def _text_field(row, box):
+    def extract(nodes):
+        rows = nodes[0]
+        if row in rows:
+            values = _class_nodes(rows[row], cls=box)
+            if values:
+                return values[0].text_content().strip()
         return None
+    return extract
 
-    return CardInfo(**kwargs)
 
+def _extract_image_link(nodes):
+    rows = nodes[0]
+    if 'cardImage' in rows:
+        src = rows['cardImage'].get('src')
+        if src is not None:
+            return 'https://gatherer.wizards.com' + src[5:]
+    return None
 
-@disk_cache('color.cache')
-def get_color_identity(mvid):
+
+def _extract_color_identity(nodes):
+    _, mana_rows, text_boxes = nodes
+    mask = 0
+    for item in mana_rows + text_boxes:
+        mask = _img_colors(item, mask)
+    return ColorMask(mask)
+
+
+def _extract_other_printings(nodes):
+    rows = nodes[0]
+    if 'otherSetsValue' not in rows:
+        return None
+    printings = []
+    for link in rows['otherSetsValue'].iterdescendants('a'):
+        try:
+            printings.append(split_and_cut(link.get('href'), '=', -1))
+        except Exception as e:
+            logging.exception("Error parsing link")
+    return printings
+
+
+_extractors = dict({field: _text_field(row, box) for field, (row, box) in TEXT_FIELDS.items()},
+                   image_link=_extract_image_link, color_identity=_extract_color_identity,
+                   other_printings=_extract_other_printings)
+# field -> function of page_nodes returning its value, or None if the page does not have it,
+# in the key order of CARD_FIELDS
+FIELD_EXTRACTORS = {field: _extractors[field] for field in CARD_FIELDS if field in _extractors}
+
+
+def timed_field(field, fun, arg):
+    """Return fun(arg), adding its time to field_times[field] while PROFILE is on."""
+    if not PROFILE:
+        return fun(arg)
+    start = time.perf_counter()
+    try:
+        return fun(arg)
+    finally:
+        record_field(field, time.perf_counter() - start)
+
+
+def extract_page(body):
     """
-    Get a set of colors in the cards color identity. Card passed as two lines from a dec file.
+    Extract the CardInfo keyword arguments and color identity mask from a details page.
+
+    Produces the same result as extract_page_soup, but parses with lxml and finds every row
+    and mana symbol container in one pass before reading the fields out of those subtrees.
     """
-    res = set()
-    r_url = 'http://gatherer.wizards.com/Pages/Card/Details.aspx?multiverseid={}'.format(mvid)
-    doc = None
-    req = urllib.request.urlopen(r_url)
-    doc = BeautifulSoup(req.read(), "lxml")
-    req.close()
+    nodes = timed_field('document', page_nodes, body)
+    card = {}
+    for field, extractor in FIELD_EXTRACTORS.items():
+        value = timed_field(field, extractor, nodes)
+        if value is not None:
+            card[field] = value
+    return card, card['color_identity']
 
-    search_items = doc.find_all(**{'class': 'manaRow'})
-    search_items += doc.find_all(**{'class': 'cardtextbox'})
-    for item in search_items:
-        image_items = item.find_all('img')
-        for img in image_items:
-            possibles = img.get('alt')
-            if possibles is None:
+
+def compress_page(body):
+    """
+    Compress a page for storage, returning the codec used and the compressed bytes.
+
+    Uses zstd if the zstandard package is installed and zlib otherwise.
+    """
+    if zstandard is not None:
+        return 'zstd', zstandard.ZstdCompressor(level=10).compress(body)
+    return 'zlib', zlib.compress(body, 9)
+
+
+def decompress_page(codec, data):
+    if codec == 'zstd':
+        if zstandard is None:
+            raise RuntimeError("The page was stored with zstd but zstandard is not installed")
+        return zstandard.ZstdDecompressor().decompress(data)
+    return zlib.decompress(data)
+
+
+FIELD_DEFAULTS = dict(zip(CardInfo.FIELDS, CardInfo.__init__.__defaults__))
+
+
+class LazyCardInfo(CardInfo):
+    """
+    CardInfo backed by a stored page, extracting each field the first time it is read.
+
+    page is a get_page record. Extracted values are memoized in its 'fields' and fields
+    whose extractor raised are left at their default, with the error kept in its 'errors'
+    instead. Fields without an extractor read as their default and are not memoized.
+    on_extract is called with the field, its value and its error (one of them None) after
+    every new extraction so the result can be persisted. Pickling produces a plain CardInfo.
+    """
+    __slots__ = ('_page', '_nodes', '_on_extract')
+
+    def __init__(self, page, on_extract=None):
+        page.setdefault('fields', {})
+        page.setdefault('errors', {})
+        object.__setattr__(self, '_page', page)
+        object.__setattr__(self, '_nodes', None)
+        object.__setattr__(self, '_on_extract', on_extract)
+        object.__setattr__(self, '_str', None)
+
+    @property
+    def errors(self):
+        """Dict from field to the error raised extracting it."""
+        return self._page['errors']
+
+    def extracted(self, field):
+        """Return the value extracted for field, or None if the page does not have it."""
+        page = self._page
+        if field not in page['fields'] and field not in page['errors']:
+            self._extract(field)
+        return page['fields'].get(field)
+
+    def _extract(self, field):
+        page = self._page
+        extractor = FIELD_EXTRACTORS.get(field)
+        if extractor is None or page['body'] is None:
+            # Nothing is stored, so an extractor added later still gets to run on this page
+            return
+        value = error = None
+        try:
+            if self._nodes is None:
+                body = decompress_page(page['codec'], page['body'])
+                object.__setattr__(self, '_nodes', timed_field('document', page_nodes, body))
+            value = page['fields'][field] = timed_field(field, extractor, self._nodes)
+        except Exception as e:
+            logging.warning("Error extracting %s: %r", field, e)
+            error = page['errors'][field] = '{}: {}'.format(type(e).__name__, e)
+            with _stats_lock:
+                extraction_failures[field] += 1
+            log_event('extraction_failure', field=field, error=error)
+        if self._on_extract is not None:
+            self._on_extract(field, value, error)
+
+    def __getattr__(self, name):
+        if name not in self.FIELDS:
+            raise AttributeError(name)
+        value = self.extracted(name)
+        if value is None:
+            value = FIELD_DEFAULTS[name]
+        if isinstance(value, list):
+            value = tuple(value)
+        if name == 'color_identity':
+            value = ColorMask(value)
+        object.__setattr__(self, name, value)
+        return value
+
+
+class Response:
+    def __init__(self, status, headers, body, wire_bytes):
+        self.status = status
+        self.headers = headers
+        self.body = body
+        self.wire_bytes = wire_bytes
+
+
+class HttpSession:
+    """
+    Reusable HTTP client for Gatherer requests.
+
+    Keeps a keep-alive connection per host in each thread, asks for gzip, applies separate
+    connect and read timeouts and retries failed requests with exponential backoff. Passing
+    the ETag/Last-Modified of an earlier response makes the request conditional, so an
+    unchanged page costs a 304 instead of the full body. Totals are kept in stats and the
+    time of each request, redirects and retries included, in the latency histogram.
+    """
+
+    def __init__(self, connect_timeout=5, read_timeout=30, retries=3, backoff=0.5, max_redirects=5):
+        self.connect_timeout = connect_timeout
+        self.read_timeout = read_timeout
+        self.retries = retries
+        self.backoff = backoff
+        self.max_redirects = max_redirects
+        self.stats = Counter()
+        self.latency = Histogram()
+        self._local = threading.local()
+        self._lock = threading.Lock()
+
+    def _connection(self, scheme, host):
+        conns = self._local.__dict__.setdefault('conns', {})
+        conn = conns.get((scheme, host))
+        if conn is None:
+            cls = http.client.HTTPSConnection if scheme == 'https' else http.client.HTTPConnection
+            conn = cls(host, timeout=self.connect_timeout)
+            conn.connect()
+            conn.sock.settimeout(self.read_timeout)
+            conns[(scheme, host)] = conn
+        return conn
+
+    def _drop(self, scheme, host):
+        conn = self._local.__dict__.get('conns', {}).pop((scheme, host), None)
+        if conn is not None:
+            conn.close()
+
+    def _request(self, url, headers):
+        parts = urllib.parse.urlsplit(url)
+        path = parts.path or '/'
+        if parts.query:
+            path += '?' + parts.query
+        for attempt in range(self.retries + 1):
+            try:
+                conn = self._connection(parts.scheme, parts.netloc)
+                conn.request('GET', path, headers=headers)
+                resp = conn.getresponse()
+                raw = resp.read()
+                if resp.will_close:
+                    self._drop(parts.scheme, parts.netloc)
+                if resp.status >= 500 or resp.status == 429:
+                    raise urllib.error.HTTPError(url, resp.status, resp.reason, resp.headers, None)
+                return resp, raw
+            except (OSError, http.client.HTTPException) as e:
+                self._drop(parts.scheme, parts.netloc)
+                if attempt == self.retries:
+                    raise
+                with self._lock:
+                    self.stats['retries'] += 1
+                logging.debug("Retrying {} after {!r}".format(url, e))
+                time.sleep(self.backoff * 2 ** attempt)
+
+    def get(self, url, etag=None, last_modified=None):
+        """
+        GET url following redirects, returning a Response with the decoded body.
+
+        Raises urllib.error.HTTPError for error statuses other than 304.
+        """
+        headers = {'Accept-Encoding': 'gzip', 'Connection': 'keep-alive'}
+        if etag:
+            headers['If-None-Match'] = etag
+        if last_modified:
+            headers['If-Modified-Since'] = last_modified
+        start = time.perf_counter()
+        for _ in range(self.max_redirects + 1):
+            resp, raw = self._request(url, headers)
+            if resp.status in (301, 302, 303, 307, 308) and resp.getheader('Location'):
+                url = urllib.parse.urljoin(url, resp.getheader('Location'))
                 continue
-            possibles = possibles.replace('Variable Colorless', '')
-            for color in colors:
-                if color in possibles:
-                    res.add(color)
-    return res
+            break
+        body = raw
+        if resp.getheader('Content-Encoding', '').lower() == 'gzip':
+            body = gzip.decompress(raw)
+        seconds = time.perf_counter() - start
+        with self._lock:
+            self.stats['requests'] += 1
+            self.stats['bytes_received'] += len(raw)
+            self.stats['bytes_decoded'] += len(body)
+            self.stats['seconds'] += seconds
+            self.latency.add(seconds)
+            if resp.status == 304:
+                self.stats['not_modified'] += 1
+        log_event('fetch', url=url, status=resp.status, bytes=len(raw), seconds=round(seconds, 6))
+        if resp.status >= 400:
+            raise urllib.error.HTTPError(url, resp.status, resp.reason, resp.headers, None)
+        return Response(resp.status, resp.headers, body, len(raw))
 
 
-@disk_cache('sets.cache')
-def get_all_printings(mvid):
+session = HttpSession()
+
+
+def fetch_page(mvid, etag=None, last_modified=None):
     """
-    Return a list of ids for each printing of the card. Only returns the original mvid for split cards.
+    Download the Gatherer details page for a card, conditionally if validators are given.
     """
-    res = []
+    return session.get(DETAILS_URL.format(mvid), etag=etag, last_modified=last_modified)
 
-    r_url = 'http://gatherer.wizards.com/Pages/Card/Details.aspx?multiverseid={}'.format(mvid)
-    doc = None
-    req = urllib.request.urlopen(r_url)
-    doc = BeautifulSoup(req.read(), "lxml")
-    req.close()
-    try:
-        search_items = doc.find_all(**{"id": "ctl00_ctl00_ctl00_MainContent_SubContent_SubContent_otherSetsValue"})[0]
-        search_items = search_items.find_all('a')
-        for link in search_items:
+
+@disk_cache('gatherer.cache')
+def get_page(mvid):
+    """
+    Fetch the details page for a card once and keep it compressed for the accessors below.
+
+    Returns a dict with the page under 'body' compressed with 'codec' (see compress_page),
+    the fields extracted from it so far under 'fields', extraction errors under 'errors'
+    and the HTTP validators of the page under 'etag' and 'last_modified'. Fields are
+    extracted on first use through page_card. Setting get_page.cache.ttl makes expired
+    records be revalidated with a conditional request.
+    """
+    logging.debug("Fetching %s", mvid)
+    stale = get_page.cache.get_stale((mvid,), None)
+    if stale is not None and (stale.get('etag') or stale.get('last_modified')):
+        response = fetch_page(mvid, stale.get('etag'), stale.get('last_modified'))
+        if response.status == 304:
+            return stale
+    else:
+        response = fetch_page(mvid)
+    codec, body = compress_page(response.body)
+    return {'codec': codec, 'body': body, 'fields': {}, 'errors': {},
+            'etag': response.headers.get('ETag'), 'last_modified': response.headers.get('Last-Modified')}
+
+
+# page_archive.PageArchive read before the cache and Gatherer, see use_archive
+archive = None
+
+
+def use_archive(fname):
+    """
+    Read pages from the page_archive file fname before looking in the cache or fetching them.
+
+    Passing None stops using the archive.
+    """
+    global archive
+    from page_archive import PageArchive
+    if archive is not None:
+        archive.close()
+    archive = PageArchive(fname) if fname else None
+
+
+def load_page(mvid):
+    """
+    Return the get_page record for mvid from the archive if it has it, otherwise from get_page.
+    """
+    if archive is not None:
+        page = archive.get(mvid)
+        if page is not None:
+            return page
+    return get_page(mvid)
+
+
+NAME_INDEX_FILE = 'names.index'
+name_index = None
+
+
+def add_page_names(index, pages):
+    """
+    Add the card names of (mvid, page) pairs to index.
+    """
+    for mvid, page in pages:
+        name = page_card(mvid, page).extracted('name') if page else None
+        if name:
+            index.add(name, mvid)
+
+
+def archive_source():
+    """
+    Return the path, size and modification time identifying the archive in use, or None.
+    """
+    if archive is None:
+        return None
+    stat = os.stat(archive.fname)
+    return [os.path.abspath(archive.fname), stat.st_size, stat.st_mtime_ns]
+
+
+def sync_name_index(index, fname=NAME_INDEX_FILE):
+    """
+    Add the names of pages stored in the get_page cache since index was last synced, and of
+    every page in the archive in use if index has not seen that archive yet.
+
+    Saves the index to fname and returns True if anything was added.
+    """
+    synced = index.synced
+    for stored, (mvid,), page in get_page.cache.items_since(synced):
+        add_page_names(index, [(mvid, page)])
+        index.synced = stored
+    changed = index.synced != synced
+    source = archive_source()
+    if source is not None and source not in index.sources:
+        add_page_names(index, ((str(mvid), archive.get(mvid)) for mvid in archive.mvids()))
+        index.sources.append(source)
+        changed = True
+    if changed:
+        index.save(fname)
+    return changed
+
+
+def build_name_index(fname=NAME_INDEX_FILE):
+    """
+    Index the names of every card in the get_page cache and the archive and save the index to fname.
+    """
+    global name_index
+    index = NameIndex()
+    if not sync_name_index(index, fname):
+        index.save(fname)
+    name_index = index
+    return index
+
+
+def get_name_index():
+    """
+    Return the name index, loading it from NAME_INDEX_FILE or building it on first use.
+
+    A loaded index is first synced with the pages cached since it was saved and the archive
+    in use, see sync_name_index.
+    """
+    global name_index
+    if name_index is None:
+        index = None
+        if os.path.exists(NAME_INDEX_FILE):
             try:
-                res.append(split_and_cut(link.get('href'), '=', -1))
-            except Exception as e:
-                logging.exception("Error parsing link")
-    except:
+                index = NameIndex.load(NAME_INDEX_FILE)
+            except ValueError:
+                pass
+        if index is None:
+            build_name_index()
+        else:
+            sync_name_index(index)
+            name_index = index
+    return name_index
+
+
+def resolve_mvid(card):
+    """
+    Return card if it is a multiverse id, otherwise the newest printing of the card with that name.
+
+    Names are resolved offline against the name index, raising KeyError for unknown names.
+    """
+    if isinstance(card, int) or str(card).isdigit():
+        return card
+    mvids = get_name_index().lookup(card)
+    if not mvids:
+        # The page may have been cached since the index was last synced
+        sync_name_index(name_index)
+        mvids = name_index.lookup(card)
+    if not mvids:
+        close = [name for name, _ in get_name_index().fuzzy(card)]
+        raise KeyError("No card named {!r} in the name index{}".format(
+            card, ", did you mean {}?".format(' or '.join(close)) if close else ''))
+    return max(mvids, key=int)
+
+
+def page_card(mvid, page):
+    """
+    Return a LazyCardInfo for a get_page record, with the fields extracted from it so far.
+
+    Newly extracted fields are saved as memos on the page's cache entry, one small row each,
+    rather than by rewriting the whole record.
+    """
+    if 'body' not in page:
+        # Records cached before pages were stored only have the extracted fields
+        page = dict(page, codec=None, body=None, fields=dict(page['card']), errors={})
+    key = (resolve_mvid(mvid),)
+
+    def save(field, value, error):
+        get_page.cache.set_memo(key, field, (value, error))
+    card = LazyCardInfo(page, on_extract=save)
+    for field, (value, error) in get_page.cache.memos(key).items():
+        if error is None:
+            page['fields'][field] = value
+        else:
+            page['errors'][field] = error
+    return card
+
+
+def card_from_page(mvid, page):
+    card = page_card(mvid, page)
+    if card.extracted('name') is None:
+        return None
+    return card
+
+
+def color_identity_from_page(mvid, page):
+    return page_card(mvid, page).color_identity
+
+
+def printings_from_page(mvid, page):
+    printings = page_card(mvid, page).extracted('other_printings')
+    if printings is None:
         logging.debug("{}: Probably a split card which aren't supported yet or is only in 1 expansion".format(mvid))
         return [mvid]
-    return res
+    return printings
+
+
+def name_from_page(mvid, page):
+    name = page_card(mvid, page).extracted('name')
+    if name is None:
+        logging.error("{}: Probably a split card which aren't supported yet".format(mvid))
+        return "Unknown"
+    return name
+
+
+def get_card(mvid):
+    """
+    Return the CardInfo for a multiverse id or card name, or None if the page has no card name.
+
+    Fields other than the name are only extracted from the stored page when first read.
+    """
+    mvid = resolve_mvid(mvid)
+    return card_from_page(mvid, load_page(mvid))
+
+
+def get_color_identity(mvid):
+    """
+    Get the colors in the cards color identity as a ColorMask, which acts as a set of color names.
+
+    It compares as an int, use set(get_color_identity(mvid)) to compare with a set of names.
+    """
+    mvid = resolve_mvid(mvid)
+    return color_identity_from_page(mvid, load_page(mvid))
+
+
+def get_all_printings(mvid):
+    """
+    Return a list of ids for each printing of the card. Only returns the original mvid for split cards.
+    """
+    mvid = resolve_mvid(mvid)
+    return printings_from_page(mvid, load_page(mvid))
 
 
-@disk_cache('names.cache')
 def get_name(mvid):
     """
     Return the name of a card by id
     """
-    print(mvid)
-    r_url = 'http://gatherer.wizards.com/Pages/Card/Details.aspx?multiverseid={}'.format(mvid)
-    doc = None
-    req = urllib.request.urlopen(r_url)
-    doc = BeautifulSoup(req.read(), "lxml")
-    req.close()
+    mvid = resolve_mvid(mvid)
+    return name_from_page(mvid, load_page(mvid))
 
-    try:
-        search_item = doc.find_all(**{"id": "ctl00_ctl00_ctl00_MainContent_SubContent_SubContent_nameRow"})[0]
-        search_item = search_item.find_all(**{"class": "value"})[0]
-        return search_item.text.strip()
-    except:
-        logging.exception("Probably a split card which aren't supported yet")
-        return "Unknown"
+
+class TokenBucket:
+    """
+    Rate limiter allowing rate acquisitions per second on average and bursts of up to capacity.
+    """
+
+    def __init__(self, rate, capacity=1):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.last = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        """
+        Block until a token is available and take it.
+        """
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.last) * self.rate)
+                self.last = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = (1 - self.tokens) / self.rate
+            time.sleep(wait)
+
+
+def get_pages(mvids, jobs=8, rate=None, unresolved=None):
+    """
+    Return a dict from each distinct mvid (or card name) to its get_page record.
+
+    Archived and cached pages are returned straight away. The rest are fetched with up to jobs requests
+    in flight and, if rate is given, no more than rate requests started per second. Names not in the
+    name index are left out, with their error message put in the dict unresolved if given and logged otherwise.
+    """
+    pages = {}
+    misses = []
+    for card in dict.fromkeys(mvids):
+        try:
+            mvid = resolve_mvid(card)
+        except KeyError as e:
+            if unresolved is None:
+                logging.warning(e.args[0])
+            else:
+                unresolved[card] = e.args[0]
+            continue
+        page = archive.get(mvid) if archive is not None else None
+        if page is None:
+            page = get_page.cache.get((mvid,))
+        if page is MISSING:
+            misses.append(card)
+        else:
+            pages[card] = page
+    if misses:
+        limiter = TokenBucket(rate) if rate else None
+
+        def fetch(card):
+            if limiter is not None:
+                limiter.acquire()
+            return get_page.refresh(resolve_mvid(card))
+
+        with ThreadPoolExecutor(max_workers=jobs) as pool:
+            for card, page in zip(misses, pool.map(fetch, misses)):
+                pages[card] = page
+    return pages
+
+
+def get_cards(mvids, jobs=8, rate=None, unresolved=None):
+    """
+    Batch version of get_card returning a dict from mvid to CardInfo, see get_pages for unresolved.
+    """
+    return {mvid: card_from_page(mvid, page) for mvid, page in get_pages(mvids, jobs, rate, unresolved).items()}
+
+
+def get_color_identities(mvids, jobs=8, rate=None):
+    """
+    Batch version of get_color_identity returning a dict from mvid to ColorMask.
+    """
+    return {mvid: color_identity_from_page(mvid, page) for mvid, page in get_pages(mvids, jobs, rate).items()}
+
+
+def get_names(mvids, jobs=8, rate=None):
+    """
+    Batch version of get_name returning a dict from mvid to name.
+    """
+    return {mvid: name_from_page(mvid, page) for mvid, page in get_pages(mvids, jobs, rate).items()}
+
+
+def stats():
+    """
+    Return everything recorded so far as a dict of plain values.
+
+    'caches' has the counters of each disk_cache by file, 'archive' those of the archive in
+    use, if any, 'http' the counters and latency
+    histogram of the session, 'fields' the extraction time histograms (only recorded while
+    profiling, see enable_profiling) and 'extraction_failures' the failures by field.
+    """
+    with _stats_lock:
+        fields = {field: histogram.as_dict() for field, histogram in field_times.items()}
+        failures = dict(extraction_failures)
+    return {'caches': {cache.cache_file: dict(cache.stats) for cache in caches},
+            'archive': dict(archive.stats) if archive is not None else {},
+            'http': dict(session.stats, latency=session.latency.as_dict()),
+            'fields': fields,
+            'extraction_failures': failures}
+
+
+def format_stats(data=None):
+    """Return stats() as readable lines for a profile summary."""
+    data = stats() if data is None else data
+    lines = []
+    for cache_file, counters in data['caches'].items():
+        lines.append('cache {}: {} hits ({} negative), {} misses ({} expired), {} writes in {:.3f}s, '
+                     '{} flushes in {:.3f}s'.format(
+                         cache_file, counters.get('hits', 0), counters.get('negative_hits', 0),
+                         counters.get('misses', 0), counters.get('expired', 0),
+                         counters.get('writes', 0) + counters.get('memo_writes', 0), counters.get('write_seconds', 0),
+                         counters.get('flushes', 0), counters.get('flush_seconds', 0)))
+    if data.get('archive'):
+        lines.append('archive: {} hits, {} misses'.format(data['archive'].get('hits', 0),
+                                                          data['archive'].get('misses', 0)))
+    http = data['http']
+    latency = http['latency']
+    lines.append('http: {} requests ({} not modified, {} retries), {} bytes received, {} decoded, '
+                 '{:.3f}s, p50 <= {}ms, p95 <= {}ms'.format(
+                     http.get('requests', 0), http.get('not_modified', 0), http.get('retries', 0),
+                     http.get('bytes_received', 0), http.get('bytes_decoded', 0), http.get('seconds', 0),
+                     latency['p50_ms'], latency['p95_ms']))
+    for field, histogram in sorted(data['fields'].items(), key=lambda item: -item[1]['seconds']):
+        lines.append('parse {}: {} in {:.3f}s, {:.3f}ms each'.format(
+            field, histogram['count'], histogram['seconds'], histogram['seconds'] / histogram['count'] * 1000))
+    for field, count in sorted(data['extraction_failures'].items()):
+        lines.append('extraction failures {}: {}'.format(field, count))
+    return lines
+
+
+def iter_dec_entries(fname):
+    """
+    Yield (mvid, qty, loc) for each entry of a dec file, where loc is 'Deck' or 'SB'.
+    """
+    with open(fname) as dec_file:
+        for line in dec_file:
+            if not line.startswith('///'):
+                continue
+            mvid = split_and_cut(line, 'mvid:', 1, ' ', 0)
+            qty = split_and_cut(line, 'qty:', 1, ' ', 0)
+            loc = split_and_cut(line, 'loc:', -1).strip() if 'loc:' in line else 'Deck'
+            yield mvid, int(qty), loc
+
+
+def iter_dec(fname, loc='Deck'):
+    """
+    Yield (mvid, qty) for each entry of a dec file in loc ('Deck' or 'SB'), or every entry if loc is None.
+    """
+    for mvid, qty, entry_loc in iter_dec_entries(fname):
+        if loc is None or entry_loc == loc:
+            yield mvid, qty
+
+
+def read_dec(fname):
+    """
+    Return Counters from mvid to quantity for the main deck and sideboard of a dec file.
+    """
+    deck = Counter()
+    sideboard = Counter()
+    for mvid, qty, loc in iter_dec_entries(fname):
+        if loc == 'SB':
+            sideboard[mvid] += qty
+        else:
+            deck[mvid] += qty
+    return deck, sideboard
+
+
+def write_dec(fname, deck, sideboard=None, jobs=8, rate=None):
+    """
+    Write Counters from mvid to quantity as the main deck and sideboard of a dec file.
+
+    Names are looked up in one batch per distinct card and entries are written as they are
+    formatted. Returns the number of entries written.
+    """
+    sideboard = sideboard or Counter()
+    names = get_names(chain(deck, sideboard), jobs, rate)
+    entries = chain(((mvid, qty, 'Deck', '') for mvid, qty in deck.items()),
+                    ((mvid, qty, 'SB', 'SB: ') for mvid, qty in sideboard.items()))
+    count = 0
+    with open(fname, 'w') as of:
+        for mvid, qty, loc, prefix in entries:
+            if count:
+                of.write('\n')
+            of.write("///mvid:{0:} qty:{1:} name:{2:} loc:{3:}\n{4:}{1:} {2:}".format(
+                mvid, qty, names[mvid], loc, prefix))
+            count += 1
+    return count
 
 
 def import_dec(fname):
     """
     Return a list of mvids of cards in the dec file with repetition
+
+    Prefer read_dec or iter_dec, which do not expand quantities.
     """
-    mvids = []
-    with open(fname) as rare_file:
-        comment = True
-        for line in rare_file:
-            if comment:
-                mvid = split_and_cut(line, 'mvid:', 1, ' ', 0)
-                qty = split_and_cut(line, 'qty:', 1, ' ', 0)
-                mvids += [mvid] * int(qty)
-            comment = not comment
-    return mvids
+    return [mvid for mvid, qty in iter_dec(fname, loc=None) for _ in range(qty)]
 
 
-def export_dec(ids, fname):
+def export_dec(ids, fname, jobs=8, rate=None):
     """
-    Saves a dec file at fname with all the ids translated into cards in the
-    main deck. Does not support sideboard
+    Saves a dec file at fname with all the ids, or a Counter of them, translated into cards
+    in the main deck. Use write_dec for a sideboard.
     """
-    oc = Counter(ids)
-    res = []
-    for mvid, qty in oc.items():
-        res.append("///mvid:{0:} qty:{1:} name:{2:} loc:Deck\n{1:} {2:}".format(mvid, qty, get_name(mvid)))
+    return write_dec(fname, Counter(ids), jobs=jobs, rate=rate)
+
+
+def iter_coll2(fname):
+    """
+    Yield (mvid, qty) for each item of a coll2 file, counting regular and foil copies.
+    """
+    mvid = None
+    qty = 0
+    with open(fname) as coll_file:
+        for line in coll_file:
+            key, _, value = line.strip().lstrip('- ').partition(': ')
+            if key == 'id':
+                if mvid is not None:
+                    yield mvid, qty
+                mvid = value.strip()
+                qty = 0
+            elif mvid is not None and key in ('r', 'f'):
+                qty += int(value)
+    if mvid is not None:
+        yield mvid, qty
+
+
+def read_coll2(fname):
+    """
+    Return a Counter from mvid to quantity for a coll2 file.
+    """
+    counts = Counter()
+    for mvid, qty in iter_coll2(fname):
+        counts[mvid] += qty
+    return counts
+
+
+def write_coll2(fname, counts):
+    """
+    Write a Counter from mvid to quantity as a coll2 file sorted by mvid, one item at a time.
+
+    Returns the number of items written.
+    """
+    items = sorted((int(mvid), qty) for mvid, qty in counts.items())
     with open(fname, 'w') as of:
-        of.write('\n'.join(res))
-    return res
+        of.write('doc:\n- version: 1\n- items:')
+        for mvid, qty in items:
+            of.write('\n  - - id: {}\n    - r: {}'.format(mvid, qty))
+    return len(items)
 
 
 def import_coll2(fname):
     """
     Return a list of mvids of cards in the coll2 file without repetition
     """
-    mvids = []
-    with open(fname) as rare_file:
-        r = False
-        i = 0
-        for line in rare_file:
-            if i < 3:
-                i += 1
-                continue
-            if not r:
-                mvids.append(split_and_cut(line, 'id: ', 1).strip())
-            r = not r
-        return mvids
+    return [mvid for mvid, _ in iter_coll2(fname)]
 
 
 def export_coll2(mvids, fname):
-    res = ['doc:', '- version: 1', '- items:']
-    mvids = sorted(mvids, key=lambda x: int(x))
-    for mvid in mvids:
-        res.append('  - - id: {}\n    - r: 1'.format(mvid))
-    with open(fname, 'w') as of:
-        of.write('\n'.join(res))
-    return res
+    """
+    Save a coll2 file at fname with one copy of each of mvids.
+    """
+    return write_coll2(fname, Counter(dict.fromkeys(mvids, 1)))
+
+
+def main(cards, dec=None, coll2=None, fields=('name',), jobs=8, rate=None, archive=None,
+         profile=False, log_events=False):
+    """
+    Print the requested fields of every card given by mvid or name or listed in the dec and coll2 files.
+    """
+    enable_profiling(profile, log_events)
+    if archive:
+        use_archive(archive)
+    if log_events:
+        logging.basicConfig(level=logging.INFO, format='%(message)s')
+    cards = list(cards)
+    if dec:
+        cards += [mvid for mvid, _, _ in iter_dec_entries(dec)]
+    if coll2:
+        cards += [mvid for mvid, _ in iter_coll2(coll2)]
+    start = time.perf_counter()
+    unresolved = {}
+    for card, info in get_cards(cards, jobs, rate, unresolved).items():
+        values = [str(getattr(info, field)) if info is not None else '' for field in fields]
+        print('\t'.join([str(card)] + values))
+    for message in unresolved.values():
+        print('error: ' + message, file=sys.stderr)
+    if profile:
+        for cache in caches:
+            cache.flush()
+        print('total: {:.3f}s'.format(time.perf_counter() - start), file=sys.stderr)
+        for line in format_stats():
+            print(line, file=sys.stderr)
+    return 1 if unresolved else 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Look up cards on Gatherer through the local cache.")
+    parser.add_argument('cards', nargs='*', help="Multiverse ids or card names.")
+    parser.add_argument('--dec', type=str, help="Also look up the cards in this dec file.")
+    parser.add_argument('--coll2', type=str, help="Also look up the cards in this coll2 file.")
+    parser.add_argument('--fields', type=str, nargs='+', default=['name'], choices=CardInfo.FIELDS,
+                        help="CardInfo fields to print for each card.")
+    parser.add_argument('--jobs', type=int, default=8, help="Concurrent page fetches.")
+    parser.add_argument('--rate', type=float, help="Maximum page fetches per second.")
+    parser.add_argument('--archive', type=str, help="Read pages from this page_archive file first.")
+    parser.add_argument('--profile', action='store_true',
+                        help="Time fetches, cache use and each field extraction and print a summary to stderr.")
+    parser.add_argument('--log-events', action='store_true',
+                        help="Log every fetch, cache miss and extraction failure as json.")
+    sys.exit(main(**vars(parser.parse_args())))
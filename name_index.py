@@ -0,0 +1,149 @@
+#!/usr/bin/env python3
+"""Offline index from card names to multiverse ids with exact, prefix and fuzzy lookup."""
+import bisect
+import pickle
+import unicodedata
+from collections import Counter, defaultdict
+from itertools import chain
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+GRAM = 3
+# Bumped whenever normalize_name or the saved format changes, so old indexes are rebuilt
+VERSION = 4
+# Letters NFKD does not decompose
+FOLDED_LETTERS = str.maketrans({'Æ': 'Ae', 'æ': 'ae'})
+
+
+def normalize_name(name: str) -> str:
+    """Case fold a card name, drop accents and collapse whitespace so equivalent spellings match."""
+    name = unicodedata.normalize('NFKD', name.replace('’', "'").translate(FOLDED_LETTERS))
+    name = ''.join(c for c in name if not unicodedata.combining(c))
+    return ' '.join(name.casefold().split())
+
+
+def name_keys(name: str) -> List[str]:
+    """Return the normalized full name and, for split cards, each half."""
+    full = normalize_name(name)
+    keys = [full]
+    if '//' in full:
+        keys += [half.strip() for half in full.split('//') if half.strip()]
+    return keys
+
+
+def grams(key: str) -> Set[str]:
+    padded = '$' * (GRAM - 1) + key + '$' * (GRAM - 1)
+    return {padded[i:i + GRAM] for i in range(len(padded) - GRAM + 1)}
+
+
+def bounded_distance(a: str, b: str, bound: int) -> Optional[int]:
+    """Return the Levenshtein distance between a and b, or None if it is larger than bound."""
+    if abs(len(a) - len(b)) > bound:
+        return None
+    previous = list(range(len(b) + 1))
+    for i, ca in enumerate(a, 1):
+        current = [i] + [0] * len(b)
+        for j, cb in enumerate(b, 1):
+            current[j] = min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + (ca != cb))
+        if min(current) > bound:
+            return None
+        previous = current
+    return previous[-1] if previous[-1] <= bound else None
+
+
+class NameIndex:
+    """
+    Map normalized card names to the multiverse ids printed under them.
+
+    Exact lookups are a dict access, prefix searches bisect a sorted array of names and fuzzy
+    searches verify the candidates of similar length sharing enough trigrams with the query.
+    synced records how far into its main source the index has been filled and sources
+    identifies the other sources already added in full. Both are saved with it.
+    """
+
+    def __init__(self, entries: Iterable[Tuple[str, str]] = ()):
+        self.mvids: Dict[str, List[str]] = defaultdict(list)
+        self.names: Dict[str, str] = {}
+        self.synced = 0.0
+        self.sources: List = []
+        for name, mvid in entries:
+            self.add(name, mvid)
+        self._sorted: Optional[List[str]] = None
+        self._grams: Optional[Dict[Tuple[int, str], List[str]]] = None
+
+    def add(self, name: str, mvid: str) -> None:
+        for key in name_keys(name):
+            if mvid not in self.mvids[key]:
+                self.mvids[key].append(mvid)
+            self.names.setdefault(key, name)
+        self._sorted = None
+        self._grams = None
+
+    def __len__(self) -> int:
+        return len(self.mvids)
+
+    def lookup(self, name: str) -> List[str]:
+        """Return every mvid printed under name, or an empty list."""
+        return self.mvids.get(normalize_name(name), [])
+
+    def prefix(self, prefix: str, limit: int = 20) -> List[str]:
+        """
+        Return up to limit distinct card names starting with prefix, in sorted order.
+
+        A split card matched by its full name and a half is returned once.
+        """
+        if self._sorted is None:
+            self._sorted = sorted(self.mvids)
+        key = normalize_name(prefix)
+        res: Dict[str, None] = {}
+        for i in range(bisect.bisect_left(self._sorted, key), len(self._sorted)):
+            if not self._sorted[i].startswith(key) or len(res) == limit:
+                break
+            res.setdefault(self.names[self._sorted[i]])
+        return list(res)
+
+    def fuzzy(self, name: str, max_distance: int = 2, limit: int = 5) -> List[Tuple[str, int]]:
+        """
+        Return up to limit (card name, edit distance) pairs within max_distance of name, closest first.
+
+        A split card matched by its full name and a half is returned once, at the smaller distance.
+        """
+        key = normalize_name(name)
+        if self._grams is None:
+            self._grams = defaultdict(list)
+            for indexed in self.mvids:
+                for gram in grams(indexed):
+                    self._grams[len(indexed), gram].append(indexed)
+        query = grams(key)
+        lengths = range(max(len(key) - max_distance, 0), len(key) + max_distance + 1)
+        # Each edit changes at most GRAM of the query's grams
+        needed = len(query) - GRAM * max_distance
+        if needed > 0:
+            shared = Counter(chain.from_iterable(self._grams.get((length, gram), ())
+                                                 for length in lengths for gram in query))
+            candidates = [indexed for indexed, count in shared.items() if count >= needed]
+        else:
+            candidates = [indexed for indexed in self.mvids if len(indexed) in lengths]
+        best: Dict[str, int] = {}
+        for candidate in candidates:
+            distance = bounded_distance(key, candidate, max_distance)
+            if distance is not None:
+                display = self.names[candidate]
+                best[display] = min(distance, best.get(display, distance))
+        return sorted(best.items(), key=lambda item: (item[1], normalize_name(item[0])))[:limit]
+
+    def save(self, fname: str) -> None:
+        with open(fname, 'wb') as out:
+            data = (VERSION, dict(self.mvids), self.names, self.synced, self.sources)
+            pickle.dump(data, out, pickle.HIGHEST_PROTOCOL)
+
+    @classmethod
+    def load(cls, fname: str) -> 'NameIndex':
+        """Load an index written by save, raising ValueError if it was saved by another version."""
+        index = cls()
+        with open(fname, 'rb') as inp:
+            data = pickle.load(inp)
+        if data[0] != VERSION:
+            raise ValueError(f"{fname} is an outdated name index")
+        _, mvids, index.names, index.synced, index.sources = data
+        index.mvids.update(mvids)
+        return index
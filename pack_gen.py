@@ -1,103 +1,373 @@
 #!/usr/bin/env python3
-"""Convert from Google Sheets csv storage for cube to CubeCobra csv."""
+"""Generate sealed pools from the Google Sheets csv storage for cube."""
 import argparse
-import csv
+import math
 import random
 import sys
-from collections import OrderedDict
-from typing import Iterable
+from typing import Any, Dict, Iterable, List, Optional, Tuple
 
+from cube import COLOR_LETTERS, MAYBEBOARD, THEME_COLUMNS, load_cube
+from cube_conversion import CUBE_COBRA_HEADER, cube_cobra_row, format_row
 
-def read_file(filename: str) -> Iterable[OrderedDict]:
-    """Iterate over the lines of the csv file as an OrderedDict."""
-    with open(filename, newline='') as csv_file:
-        reader = csv.DictReader(csv_file)
-        for row in reader:
-            yield row
+try:
+    import numpy
+except ImportError:
+    numpy = None
 
+# Rarity -> cards of that rarity in each pool, written in this order
+DEFAULT_TEMPLATE = {'Common': 60, 'Uncommon': 24, 'Rare': 6, 'Land': 6}
+SECTION_NAMES = {'Common': 'COMMONS', 'Uncommon': 'UNCOMMONS', 'Rare': 'RARES', 'Land': 'LANDS'}
 
-def main(input_file: str, output_file: str, to_cube_cobra: bool = False, to_google_sheets: bool = False) -> int:
-    """Convert the csv file specified by filename."""
+Pool = Dict[str, Tuple[List[int], int, int]]
+# 'colors': (min, max) cards of each color, 'curve': {cmc: min} where the highest cmc also
+# counts everything above it and 'themes': {theme or tag: min}
+Constraints = Dict[str, Any]
+
+
+def read_cards(input_file: str, verbose: bool = False) -> List[Dict[str, Any]]:
+    """
+    Read the cards of the cube, printing them as a CubeCobra csv if verbose.
+
+    Each card has its name, rarity (No Rarity for maybeboard cards so they are never dealt),
+    colors (letters of WUBRG), cmc and rating (None if blank), themes (the names in the theme
+    columns) and tags (the tag columns set to 1).
+    """
+    cube = load_cube(input_file)
+    names = cube.column('Card Name')
+    themes = list(zip(*(cube.column(column) for column in THEME_COLUMNS)))
+    cards = []
+    if verbose:
+        print(format_row(CUBE_COBRA_HEADER))
+    for i, name in enumerate(names):
+        rarity = 'No Rarity' if cube.flags[i] & MAYBEBOARD else cube.rarity_name(i)
+        cmc, rating = cube.cmc[i], cube.rating[i]
+        cards.append({
+            "name": name,
+            "rarity": rarity,
+            "colors": ''.join(letter for bit, letter in enumerate(COLOR_LETTERS) if cube.colors[i] >> bit & 1),
+            "cmc": None if math.isnan(cmc) else cmc,
+            "rating": None if math.isnan(rating) else rating,
+            "themes": [theme for theme in themes[i] if theme not in ('', '0', '1')],
+            "tags": cube.tags_of(i),
+        })
+        if verbose:
+            print(format_row(cube_cobra_row(cube.values(i), cube.rarity[i], cube.flags[i], cards[-1]['tags'])))
+    return cards
+
+
+def bucket_by_rarity(cards: List[Dict[str, Any]]) -> Dict[str, List[int]]:
+    """Group the indices of cards by rarity in a single pass."""
+    buckets: Dict[str, List[int]] = {}
+    for index, card in enumerate(cards):
+        buckets.setdefault(card['rarity'], []).append(index)
+    return buckets
+
+
+def generate_pools(cards: List[Dict[str, Any]], players: int, template: Optional[Dict[str, int]] = None,
+                   seed: Optional[int] = None) -> List[Pool]:
+    """
+    Deal players pools following template (rarity -> cards per pool) without reusing a card.
+
+    Each rarity is shuffled once as a permutation of card indices and every pool is a
+    (permutation, start, stop) range of it, so the same seed always deals the same pools.
+    """
+    template = DEFAULT_TEMPLATE if template is None else template
+    rng = random.Random(seed)
+    buckets = bucket_by_rarity(cards)
+    pools: List[Pool] = [{} for _ in range(players)]
+    for rarity, count in template.items():
+        permutation = buckets.get(rarity, [])
+        if count * players > len(permutation):
+            raise ValueError(f"{players} pools of {count} {rarity} cards need {count * players}, "
+                             f"the cube has {len(permutation)}")
+        rng.shuffle(permutation)
+        for player, pool in enumerate(pools):
+            pool[rarity] = (permutation, player * count, (player + 1) * count)
+    return pools
+
+
+def write_pool(filename: str, cards: List[Dict[str, Any]], pool: Pool) -> None:
+    """Write a pool as a dck file with a section per rarity, each sorted by card name."""
+    with open(filename, 'w') as out_file:
+        for i, (rarity, (permutation, start, stop)) in enumerate(pool.items()):
+            if i:
+                out_file.write('\n\n')
+            out_file.write(f'{SECTION_NAMES.get(rarity, rarity.upper())}:\n')
+            for name in sorted(cards[index]['name'] for index in permutation[start:stop]):
+                out_file.write(f'\n{name}')
+
+
+def constraint_bounds(cards: List[Dict[str, Any]], constraints: Constraints
+                      ) -> Tuple[List[str], List[List[int]], List[int], List[int]]:
+    """
+    Flatten constraints into counters, returning their names, the counters each card adds
+    to and the per-pool minimum and maximum of every counter.
+    """
+    names: List[str] = []
+    lows: List[int] = []
+    highs: List[int] = []
+    large = sum(DEFAULT_TEMPLATE.values()) + len(cards)
+    low, high = constraints.get('colors') or (0, large)
+    for letter in COLOR_LETTERS:
+        names.append(f'{letter} cards')
+        lows.append(low)
+        highs.append(high)
+    curve = sorted(constraints.get('curve', {}).items())
+    for cmc, minimum in curve:
+        names.append(f'cmc {cmc:g}' + ('+' if cmc == curve[-1][0] else ''))
+        lows.append(minimum)
+        highs.append(large)
+    themes = constraints.get('themes', {})
+    for theme, minimum in themes.items():
+        names.append(f'{theme} theme')
+        lows.append(minimum)
+        highs.append(large)
+    theme_counters = {theme: 5 + len(curve) + i for i, theme in enumerate(themes)}
+    features = []
+    for card in cards:
+        counters = [i for i, letter in enumerate(COLOR_LETTERS) if letter in card['colors']]
+        if card['cmc'] is not None:
+            bucket = None
+            for i, (cmc, _) in enumerate(curve):
+                if card['cmc'] >= cmc:
+                    bucket = i
+            if bucket is not None:
+                counters.append(5 + bucket)
+        counters += [theme_counters[theme] for theme in set(card['themes'] + card['tags']) if theme in theme_counters]
+        features.append(counters)
+    return names, features, lows, highs
+
+
+def pool_counts(features: List[List[int]], pool: Pool, size: int) -> List[int]:
+    counts = [0] * size
+    for permutation, start, stop in pool.values():
+        for index in permutation[start:stop]:
+            for counter in features[index]:
+                counts[counter] += 1
+    return counts
+
+
+def violation(count: int, low: int, high: int) -> int:
+    return max(low - count, 0) + max(count - high, 0)
+
+
+def balance_pools(cards: List[Dict[str, Any]], pools: List[Pool], constraints: Constraints,
+                  seed: Optional[int] = None, iterations: int = 50000) -> List[Pool]:
+    """
+    Improve pools from generate_pools towards constraints by swapping cards of the same rarity.
+
+    A swap exchanges a card of a pool violating some constraint with a card of another pool or
+    one left in the cube, and is kept if it does not increase the total violation. Only the
+    counters the two cards touch are recomputed, so each step is cheap. Pools are changed in place.
+    """
+    if not pools:
+        return pools
+    rng = random.Random(seed)
+    names, features, lows, highs = constraint_bounds(cards, constraints)
+    counts = [pool_counts(features, pool, len(names)) for pool in pools]
+    penalties = [sum(violation(c, lo, hi) for c, lo, hi in zip(pool_count, lows, highs))
+                 for pool_count in counts]
+    # A rarity with a single card in the cube has nothing to swap with
+    slots = [(rarity, offset) for rarity, (permutation, start, stop) in pools[0].items()
+             if len(permutation) > 1 for offset in range(stop - start)]
+
+    def delta(pool: int, remove: int, add: int) -> int:
+        if pool < 0:
+            return 0
+        change: Dict[int, int] = {}
+        for counter in features[remove]:
+            change[counter] = change.get(counter, 0) - 1
+        for counter in features[add]:
+            change[counter] = change.get(counter, 0) + 1
+        pool_count = counts[pool]
+        return sum(violation(pool_count[c] + d, lows[c], highs[c]) - violation(pool_count[c], lows[c], highs[c])
+                   for c, d in change.items() if d)
+
+    def apply(pool: int, remove: int, add: int) -> None:
+        if pool < 0:
+            return
+        for counter in features[remove]:
+            counts[pool][counter] -= 1
+        for counter in features[add]:
+            counts[pool][counter] += 1
+
+    for _ in range(iterations if slots else 0):
+        violated = [i for i, penalty in enumerate(penalties) if penalty]
+        if not violated:
+            break
+        pool = rng.choice(violated)
+        rarity, offset = rng.choice(slots)
+        permutation, start, stop = pools[pool][rarity]
+        count = stop - start
+        mine = start + offset
+        theirs = rng.randrange(len(permutation) - 1)
+        if theirs >= mine:
+            theirs += 1
+        other = theirs // count if theirs < count * len(pools) else -1
+        if other == pool:
+            continue
+        remove, add = permutation[mine], permutation[theirs]
+        mine_delta, their_delta = delta(pool, remove, add), delta(other, add, remove)
+        if mine_delta + their_delta <= 0 and mine_delta <= 0:
+            apply(pool, remove, add)
+            apply(other, add, remove)
+            penalties[pool] += mine_delta
+            if other >= 0:
+                penalties[other] += their_delta
+            permutation[mine], permutation[theirs] = add, remove
+    return pools
+
+
+def balance_report(cards: List[Dict[str, Any]], pools: List[Pool], constraints: Constraints) -> Iterable[str]:
+    """Describe how well each pool meets constraints, one line per constraint."""
+    names, features, lows, highs = constraint_bounds(cards, constraints)
+    counts = [pool_counts(features, pool, len(names)) for pool in pools]
+    met = sum(all(lo <= c <= hi for c, lo, hi in zip(pool_count, lows, highs)) for pool_count in counts)
+    yield f'{met} of {len(pools)} pools meet every constraint'
+    if not pools:
+        return
+    for i, name in enumerate(names):
+        values = [pool_count[i] for pool_count in counts]
+        missed = sum(not lows[i] <= value <= highs[i] for value in values)
+        target = f'{lows[i]}-{highs[i]}' if i < 5 and constraints.get('colors') else f'>= {lows[i]}'
+        yield f'{name:<24} target {target:<8} min {min(values):>4} max {max(values):>4} missed by {missed} pools'
+
+
+def simulate(cards: List[Dict[str, Any]], pools: int, players: int = 3,
+             template: Optional[Dict[str, int]] = None, seed: Optional[int] = None,
+             batch: int = 2000) -> Dict[str, Any]:
+    """
+    Deal pools pools, players at a time as generate_pools would, and measure each of them.
+
+    Cards are integer ids into feature arrays (colors, cmc, rating, themes and tags), each
+    batch of deals is a row-wise numpy permutation per rarity and the per-pool measures are
+    array reductions over the dealt ids. Returns a dict from measure name to an array with
+    one value per pool.
+    """
+    if numpy is None:
+        raise RuntimeError("simulate needs numpy installed")
+    template = DEFAULT_TEMPLATE if template is None else template
+    rng = numpy.random.default_rng(seed)
+    buckets = {rarity: numpy.array(indices) for rarity, indices in bucket_by_rarity(cards).items()}
+    for rarity, count in template.items():
+        if count * players > len(buckets.get(rarity, ())):
+            raise ValueError(f"{players} pools of {count} {rarity} cards need {count * players}, "
+                             f"the cube has {len(buckets.get(rarity, ()))}")
+
+    colors = numpy.array([[letter in card['colors'] for letter in COLOR_LETTERS] for card in cards], dtype=bool)
+    # Cards castable with each two color pair, colorless cards included
+    pairs = [a + b for i, a in enumerate(COLOR_LETTERS) for b in COLOR_LETTERS[i + 1:]]
+    castable = numpy.array([[set(card['colors']) <= set(pair) for pair in pairs] for card in cards], dtype=bool)
+    cmc = numpy.array([numpy.nan if card['cmc'] is None else card['cmc'] for card in cards])
+    rating = numpy.array([numpy.nan if card['rating'] is None else card['rating'] for card in cards])
+    labels = sorted({label for card in cards for label in card['themes'] + card['tags']})
+    label_index = {label: i for i, label in enumerate(labels)}
+    has_label = numpy.zeros((len(cards), len(labels)), dtype=bool)
+    for i, card in enumerate(cards):
+        has_label[i, [label_index[label] for label in card['themes'] + card['tags']]] = True
+
+    results: Dict[str, List[Any]] = {'colors': [], 'best pair': [], 'cmc': [], 'rating': [], 'labels': []}
+    deals = -(-pools // players)
+    while deals > 0:
+        size = min(batch, deals)
+        deals -= size
+        dealt = []
+        for rarity, count in template.items():
+            shuffled = rng.permuted(numpy.tile(buckets[rarity], (size, 1)), axis=1)
+            dealt.append(shuffled[:, :count * players].reshape(size * players, count))
+        ids = numpy.concatenate(dealt, axis=1)
+        results['colors'].append(colors[ids].sum(axis=1))
+        results['best pair'].append(castable[ids].sum(axis=1).max(axis=1))
+        results['cmc'].append(numpy.nanmean(cmc[ids], axis=1))
+        results['rating'].append(numpy.nanmean(rating[ids], axis=1))
+        results['labels'].append(has_label[ids].sum(axis=1))
+    stats = {name: numpy.concatenate(values)[:pools] for name, values in results.items()}
+    stats['label names'] = labels
+    return stats
+
+
+def report(stats: Dict[str, Any], percentiles: Tuple[int, ...] = (5, 25, 50, 75, 95)) -> Iterable[str]:
+    """Describe the per-pool measures from simulate as lines of percentiles."""
+    def line(name: str, values: Any) -> str:
+        points = numpy.nanpercentile(values, percentiles)
+        return f'{name:<24}' + ''.join(f'{point:>9.2f}' for point in points)
+
+    yield f'{len(stats["cmc"])} pools' + ' ' * 13 + ''.join(f'{f"p{p}":>9}' for p in percentiles)
+    for i, letter in enumerate(COLOR_LETTERS):
+        yield line(f'{letter} cards', stats['colors'][:, i])
+    yield line('best color pair cards', stats['best pair'])
+    yield line('average cmc', stats['cmc'])
+    yield line('average rating', stats['rating'])
+    for i, label in enumerate(stats['label names']):
+        yield line(label[:24], stats['labels'][:, i])
+
+
+def parse_template(slots: List[str]) -> Dict[str, int]:
+    """Parse Rarity=count arguments into a template."""
+    template = {}
+    for slot in slots:
+        rarity, _, count = slot.partition('=')
+        template[rarity] = int(count)
+    return template
+
+
+def parse_constraints(color_range: Optional[str], curve: Optional[List[str]],
+                      themes: Optional[List[str]]) -> Constraints:
+    """Parse MIN:MAX, CMC=MIN and THEME=MIN arguments into constraints."""
+    constraints: Constraints = {}
+    if color_range:
+        low, _, high = color_range.partition(':')
+        constraints['colors'] = (int(low), int(high))
+    if curve:
+        constraints['curve'] = {float(cmc): int(minimum) for cmc, minimum in parse_template(curve).items()}
+    if themes:
+        constraints['themes'] = {theme: int(minimum) for theme, minimum in
+                                 (argument.rpartition('=')[::2] for argument in themes)}
+    return constraints
+
+
+def main(input_file: str, output_file: str, to_cube_cobra: bool = False, to_google_sheets: bool = False,
+         players: int = 3, seed: Optional[int] = None, slots: Optional[List[str]] = None,
+         verbose: bool = False, simulate_pools: int = 0, color_range: Optional[str] = None,
+         curve: Optional[List[str]] = None, themes: Optional[List[str]] = None) -> int:
+    """Generate players pools from the cube in input_file as output_file-pN.dck."""
     if to_cube_cobra:
-        output = ["Name,CMC,Type,Color,Set,Collector Number,Status,Tags"]
-        special_columns = ['Card Name', 'Colors', 'CMC', 'Rarity', 'Rating', 'Set',
-                           'Main Theme', 'Secondary Theme', 'Tertiary Theme',
-                           'Power', 'Toughness', "Collector's Number"]
-        rarity_map = {'C': 'Common', 'U': 'Uncommon', 'R': 'Rare', 'L': 'Land'}
-        cards = []
-        for row in read_file(input_file):
-            if len(row['Card Name']) == 0:
-                continue
-            name = row['Card Name']
-            cmc = row['CMC']
-            color = row['Colors']
-            color = color.replace('/', '').replace('-', '')
-            if color == "GW":
-                color = "WG"
-            elif color == "RW":
-                color = "WR"
-            elif color == "GU":
-                color = "UG"
-            card_set = row['Set']
-            status = 'Not Owned'
-            collectors_number = row["Collector's Number"]
-            try:
-                if int(row['Premium']):
-                    status = 'Premium Owned'
-            except ValueError:
-                pass
-            if status == "Not Owned":
-                try:
-                    if int(row['Have Copy']):
-                        status = 'Owned'
-                except ValueError:
-                    pass
-            rarity = rarity_map.get(row['Rarity'], 'No Rarity')
-            tags = [rarity]
-            rating = row['Rating']
-            if len(rating) > 0:
-                tags.append(f'rating-{rating}')
-            for column, value in row.items():
-                if column not in special_columns:
-                    try:
-                        if int(value):
-                            tags.append(column)
-                    except ValueError:
-                        pass
-            card = {
-             "name": name,
-             "rarity": rarity
-            }
-            cards.append(card)
-            output.append(f'"{name}",{cmc},,{color},{card_set},{collectors_number},{status},"{", ".join(tags)}"')
-            print(output[-1])
-        commons = [card for card in cards if card["rarity"] == "Common"]
-        uncommons = [card for card in cards if card["rarity"] == "Uncommon"]
-        rares = [card for card in cards if card["rarity"] == "Rare"]
-        lands = [card for card in cards if card["rarity"] == "Land"]
-        random.shuffle(commons)
-        random.shuffle(uncommons)
-        random.shuffle(rares)
-        random.shuffle(lands)
-        with open(output_file+'-p1.dck', 'w') as out_file:
-            pool = ['COMMONS:', ''] + sorted(commons[:60], key=lambda c: c['name']) + ['', 'UNCOMMONS:', ''] + sorted(uncommons[:24], key=lambda c: c['name']) + ['', 'RARES:', ''] + sorted(rares[:6], key=lambda c: c['name']) + ['', 'LANDS:', ''] + sorted(lands[:6], key=lambda c: c['name'])
-            out_file.write('\n'.join(str(card) for card in pool))
-        with open(output_file+'-p2.dck', 'w') as out_file:
-            pool = ['COMMONS:', ''] + sorted(commons[60:120], key=lambda c: c['name']) + ['', 'UNCOMMONS:', ''] + sorted(uncommons[24:48], key=lambda c: c['name']) + ['', 'RARES:', ''] + sorted(rares[6:12], key=lambda c: c['name']) + ['', 'LANDS:', ''] + sorted(lands[6:12], key=lambda c: c['name'])
-            out_file.write('\n'.join(str(card) for card in pool))
-        with open(output_file+'-p3.dck', 'w') as out_file:
-            pool = ['COMMONS:', ''] + sorted(commons[120:180], key=lambda c: c['name']) + ['', 'UNCOMMONS:', ''] + sorted(uncommons[48:72], key=lambda c: c['name']) + ['', 'RARES:', ''] + sorted(rares[12:18], key=lambda c: c['name']) + ['', 'LANDS:', ''] + sorted(lands[12:18], key=lambda c: c['name'])
-            out_file.write('\n'.join(str(card) for card in pool))
-        # with open(output_file, 'w') as out_file:
-        #     out_file.write('\n'.join(output))
+        cards = read_cards(input_file, verbose)
+        template = parse_template(slots) if slots else None
+        if simulate_pools:
+            for line in report(simulate(cards, simulate_pools, players, template, seed)):
+                print(line)
+            return 0
+        pools = generate_pools(cards, players, template, seed)
+        constraints = parse_constraints(color_range, curve, themes)
+        if constraints:
+            balance_pools(cards, pools, constraints, seed)
+            for line in balance_report(cards, pools, constraints):
+                print(line)
+        for player, pool in enumerate(pools, 1):
+            write_pool(f'{output_file}-p{player}.dck', cards, pool)
     return 0
 
 
 if __name__ == "__main__":
-    parser = argparse.ArgumentParser(description="Convert between Google Sheets csv and Cube Cobra csv for cube.")
+    parser = argparse.ArgumentParser(description="Generate sealed pools from the Google Sheets csv for cube.")
     group = parser.add_mutually_exclusive_group(required=True)
     group.add_argument('--to-cube-cobra', action='store_true', help="Import to CubeCobra format for csv.")
     group.add_argument('--to-google-sheets', action='store_true', help="Export to Google Sheets format for csv.")
     parser.add_argument('--input-file', type=str, help="The file to import/export from.", required=True)
     parser.add_argument('--output-file', type=str, help="The file to import/export to.", required=True)
+    parser.add_argument('--players', type=int, default=3, help="Number of pools to generate.")
+    parser.add_argument('--seed', type=int, help="Seed for reproducible pools.")
+    parser.add_argument('--slots', type=str, nargs='+', metavar='RARITY=COUNT',
+                        help="Cards of each rarity per pool, default Common=60 Uncommon=24 Rare=6 Land=6.")
+    parser.add_argument('--verbose', action='store_true', help="Print the cards as a CubeCobra csv.")
+    parser.add_argument('--simulate', dest='simulate_pools', type=int, default=0, metavar='POOLS',
+                        help="Instead of writing pools, deal this many and report their statistics.")
+    parser.add_argument('--color-range', type=str, metavar='MIN:MAX',
+                        help="Balance pools to hold between MIN and MAX cards of each color.")
+    parser.add_argument('--curve', type=str, nargs='+', metavar='CMC=MIN',
+                        help="Balance pools to hold at least MIN cards of each CMC, "
+                             "the highest CMC counting those above.")
+    parser.add_argument('--theme', dest='themes', type=str, nargs='+', metavar='THEME=MIN',
+                        help="Balance pools to hold at least MIN cards with each theme.")
     sys.exit(main(**vars(parser.parse_args())))
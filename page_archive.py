@@ -0,0 +1,244 @@
+#!/usr/bin/env python3
+"""Prefetch Gatherer details pages into one compressed archive file that is read through mmap."""
+import argparse
+import http.client
+import logging
+import mmap
+import os
+import struct
+import sys
+import urllib.error
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+import gatherer
+
+MAGIC = b'GATHARC1'
+# magic, pages in the slot table, offset of the slot table (0 until the archive is finished), slots
+HEADER = struct.Struct('<8sQQQ')
+# mvid, codec and compressed length, written before each page
+RECORD = struct.Struct('<QBI')
+# mvid + 1 (0 marks an empty slot), offset of the page, compressed length, codec
+SLOT = struct.Struct('<QQII')
+CODECS = {'zlib': 1, 'zstd': 2}
+CODEC_NAMES = {code: name for name, code in CODECS.items()}
+
+
+def slot_of(mvid: int, mask: int) -> int:
+    return (mvid * 0x9E3779B97F4A7C15 >> 20) & mask
+
+
+class PageArchive:
+    """
+    Read only view of a finished archive.
+
+    The file is memory mapped and pages are found through an open addressing table of
+    fixed size slots, so a lookup reads one or two slots and the compressed page itself
+    however large the archive is. Hits and misses are kept in stats.
+    """
+
+    def __init__(self, fname: str):
+        self.fname = fname
+        with open(fname, 'rb') as inp:
+            self._data = mmap.mmap(inp.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, self.count, self._table, slots = HEADER.unpack_from(self._data, 0)
+        if magic != MAGIC:
+            raise ValueError(f"{fname} is not a page archive")
+        if not self._table:
+            raise ValueError(f"{fname} was not finished, prefetch into it again to resume")
+        self._mask = slots - 1
+        self.stats = Counter()
+
+    def _find(self, mvid: int) -> Optional[Tuple[int, int, int]]:
+        i = slot_of(mvid, self._mask)
+        while True:
+            key, offset, length, codec = SLOT.unpack_from(self._data, self._table + i * SLOT.size)
+            if key == 0:
+                return None
+            if key == mvid + 1:
+                return offset, length, codec
+            i = (i + 1) & self._mask
+
+    def __len__(self) -> int:
+        return self.count
+
+    def __contains__(self, mvid) -> bool:
+        return str(mvid).isdigit() and self._find(int(mvid)) is not None
+
+    def mvids(self) -> Iterator[int]:
+        for i in range(self._mask + 1):
+            key = SLOT.unpack_from(self._data, self._table + i * SLOT.size)[0]
+            if key:
+                yield key - 1
+
+    def get(self, mvid) -> Optional[Dict]:
+        """Return a get_page style record for mvid, or None if it is not archived."""
+        found = self._find(int(mvid)) if str(mvid).isdigit() else None
+        if found is None:
+            self.stats['misses'] += 1
+            return None
+        self.stats['hits'] += 1
+        offset, length, codec = found
+        return {'codec': CODEC_NAMES[codec], 'body': self._data[offset:offset + length],
+                'fields': {}, 'errors': {}, 'etag': None, 'last_modified': None}
+
+    def body(self, mvid) -> Optional[bytes]:
+        """Return the decompressed page of mvid, or None if it is not archived."""
+        page = self.get(mvid)
+        return None if page is None else gatherer.decompress_page(page['codec'], page['body'])
+
+    def close(self) -> None:
+        self._data.close()
+
+
+class ArchiveWriter:
+    """
+    Append pages to an archive, creating it or resuming a finished or interrupted one.
+
+    Every page is written behind a small record header, so after a crash the pages written
+    so far are recovered by scanning the records. close writes the slot table after the
+    last page and marks the archive finished.
+    """
+
+    def __init__(self, fname: str):
+        self.entries: Dict[int, Tuple[int, int, int]] = {}
+        if not os.path.exists(fname):
+            with open(fname, 'wb') as out:
+                out.write(HEADER.pack(MAGIC, 0, 0, 0))
+        self._file = open(fname, 'r+b')
+        self._recover()
+
+    def _recover(self) -> None:
+        size = os.fstat(self._file.fileno()).st_size
+        magic, count, table, slots = HEADER.unpack(self._file.read(HEADER.size))
+        if magic != MAGIC:
+            raise ValueError(f"{self._file.name} is not a page archive")
+        if table:
+            self._file.seek(table)
+            data = self._file.read(slots * SLOT.size)
+            for i in range(slots):
+                key, offset, length, codec = SLOT.unpack_from(data, i * SLOT.size)
+                if key:
+                    self.entries[key - 1] = (offset, length, codec)
+            end = table
+        else:
+            end = HEADER.size
+            while end + RECORD.size <= size:
+                self._file.seek(end)
+                mvid, codec, length = RECORD.unpack(self._file.read(RECORD.size))
+                if end + RECORD.size + length > size:
+                    break
+                self.entries[mvid] = (end + RECORD.size, length, codec)
+                end += RECORD.size + length
+        self._file.truncate(end)
+        self._file.seek(0)
+        self._file.write(HEADER.pack(MAGIC, 0, 0, 0))
+        self._file.seek(end)
+
+    def __contains__(self, mvid) -> bool:
+        return int(mvid) in self.entries
+
+    def add(self, mvid, codec: str, data: bytes) -> None:
+        offset = self._file.tell()
+        self._file.write(RECORD.pack(int(mvid), CODECS[codec], len(data)))
+        self._file.write(data)
+        self.entries[int(mvid)] = (offset + RECORD.size, len(data), CODECS[codec])
+
+    def flush(self) -> None:
+        self._file.flush()
+
+    def close(self) -> None:
+        slots = 8
+        while slots < 2 * len(self.entries):
+            slots *= 2
+        table = bytearray(slots * SLOT.size)
+        for mvid, (offset, length, codec) in self.entries.items():
+            i = slot_of(mvid, slots - 1)
+            while SLOT.unpack_from(table, i * SLOT.size)[0]:
+                i = (i + 1) & (slots - 1)
+            SLOT.pack_into(table, i * SLOT.size, mvid + 1, offset, length, codec)
+        start = self._file.tell()
+        self._file.write(table)
+        self._file.seek(0)
+        self._file.write(HEADER.pack(MAGIC, len(self.entries), start, slots))
+        self._file.close()
+
+
+def prefetch(fname: str, mvids: Iterable, jobs: int = 8, rate: Optional[float] = None,
+             batch: int = 256) -> Tuple[int, int, int]:
+    """
+    Add the details page of every mvid not already in the archive fname.
+
+    Pages already in the get_page cache are copied from it, the rest are fetched with up to
+    jobs requests in flight and at most rate started per second. Pages are written as each
+    batch completes, so an interrupted run keeps what it fetched and the next one resumes.
+    Returns the number of pages added, already archived and failed.
+    """
+    writer = ArchiveWriter(fname)
+    limiter = gatherer.TokenBucket(rate) if rate else None
+
+    def fetch(mvid: int) -> Tuple[str, bytes]:
+        for key in (str(mvid), mvid):
+            cached = gatherer.get_page.cache.get_stale((key,), None)
+            if cached and cached.get('body') is not None:
+                return cached['codec'], cached['body']
+        if limiter is not None:
+            limiter.acquire()
+        return gatherer.compress_page(gatherer.fetch_page(mvid).body)
+
+    added = failed = 0
+    try:
+        wanted = list(dict.fromkeys(int(mvid) for mvid in mvids))
+        todo = [mvid for mvid in wanted if mvid not in writer]
+        with ThreadPoolExecutor(max_workers=jobs) as pool:
+            for start in range(0, len(todo), batch):
+                chunk = todo[start:start + batch]
+                for mvid, future in zip(chunk, [pool.submit(fetch, mvid) for mvid in chunk]):
+                    try:
+                        codec, data = future.result()
+                    except (OSError, http.client.HTTPException, urllib.error.URLError) as e:
+                        logging.warning("Could not fetch {}: {!r}".format(mvid, e))
+                        failed += 1
+                        continue
+                    writer.add(mvid, codec, data)
+                    added += 1
+                writer.flush()
+                logging.info("Archived {} of {} pages".format(start + len(chunk), len(todo)))
+    finally:
+        writer.close()
+    return added, len(wanted) - len(todo), failed
+
+
+def main(archive: str, mvids: List[str], dec: Optional[str] = None, coll2: Optional[str] = None,
+         mvid_range: Optional[List[int]] = None, printings: Optional[List[str]] = None,
+         jobs: int = 8, rate: Optional[float] = None) -> int:
+    """Prefetch the pages of the given mvids, files, range and printings into the archive."""
+    logging.basicConfig(level=logging.INFO, format='%(message)s')
+    wanted = list(mvids)
+    if dec:
+        wanted += [mvid for mvid, _, _ in gatherer.iter_dec_entries(dec)]
+    if coll2:
+        wanted += [mvid for mvid, _ in gatherer.iter_coll2(coll2)]
+    if mvid_range:
+        wanted += range(mvid_range[0], mvid_range[1] + 1)
+    for mvid in printings or ():
+        wanted += gatherer.get_all_printings(mvid)
+    added, skipped, failed = prefetch(archive, wanted, jobs, rate)
+    print(f"Added {added} pages, {skipped} already archived, {failed} failed")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Prefetch Gatherer pages into an archive for offline use.")
+    parser.add_argument('archive', help="The archive file to create or add to.")
+    parser.add_argument('mvids', nargs='*', help="Multiverse ids to prefetch.")
+    parser.add_argument('--dec', type=str, help="Also prefetch the cards in this dec file.")
+    parser.add_argument('--coll2', type=str, help="Also prefetch the cards in this coll2 file.")
+    parser.add_argument('--range', dest='mvid_range', type=int, nargs=2, metavar=('FIRST', 'LAST'),
+                        help="Also prefetch every mvid from FIRST to LAST, such as the block of a set.")
+    parser.add_argument('--printings', type=str, nargs='+', metavar='CARD',
+                        help="Also prefetch every printing of these cards, by mvid or name.")
+    parser.add_argument('--jobs', type=int, default=8, help="Concurrent page fetches.")
+    parser.add_argument('--rate', type=float, help="Maximum page fetches per second.")
+    sys.exit(main(**vars(parser.parse_args())))
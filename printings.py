@@ -0,0 +1,156 @@
+#!/usr/bin/env python3
+"""Group every printing of a card into one equivalence class and keep the classes on disk."""
+import argparse
+import sqlite3
+import sys
+from typing import Dict, Iterable, List, Optional
+
+import gatherer
+
+INDEX_FILE = 'printings.index'
+
+
+class UnionFind:
+    """Disjoint sets of mvids with path halving and union by size."""
+
+    def __init__(self):
+        self.parent: Dict[str, str] = {}
+        self.size: Dict[str, int] = {}
+
+    def find(self, item: str) -> str:
+        if item not in self.parent:
+            self.parent[item] = item
+            self.size[item] = 1
+            return item
+        while self.parent[item] != item:
+            self.parent[item] = self.parent[self.parent[item]]
+            item = self.parent[item]
+        return item
+
+    def union(self, a: str, b: str) -> str:
+        a, b = self.find(a), self.find(b)
+        if a == b:
+            return a
+        if self.size[a] < self.size[b]:
+            a, b = b, a
+        self.parent[b] = a
+        self.size[a] += self.size.pop(b)
+        return a
+
+    def groups(self) -> Dict[str, List[str]]:
+        res: Dict[str, List[str]] = {}
+        for item in self.parent:
+            res.setdefault(self.find(item), []).append(item)
+        return res
+
+
+class PrintingIndex:
+    """
+    Map each mvid to a card id shared by every printing of the same card.
+
+    The card id of a class is its smallest mvid, so it does not depend on the order printings
+    were discovered in. Lookups are single indexed queries against the SQLite file.
+    """
+
+    def __init__(self, fname: str = INDEX_FILE):
+        self.conn = sqlite3.connect(fname)
+        self.conn.execute('CREATE TABLE IF NOT EXISTS printings ('
+                          'mvid TEXT PRIMARY KEY, card_id INTEGER, crawled INTEGER DEFAULT 0)')
+        self.conn.execute('CREATE INDEX IF NOT EXISTS printings_card ON printings (card_id)')
+
+    def card_id(self, mvid) -> Optional[int]:
+        """Return the card id of mvid, or None if it is not indexed."""
+        row = self.conn.execute('SELECT card_id FROM printings WHERE mvid = ?', (str(mvid),)).fetchone()
+        return None if row is None else row[0]
+
+    def printings(self, mvid) -> List[str]:
+        """Return every known printing of the card printed as mvid, including mvid itself."""
+        card_id = self.card_id(mvid)
+        if card_id is None:
+            return [str(mvid)]
+        rows = self.conn.execute('SELECT mvid FROM printings WHERE card_id = ?', (card_id,))
+        return sorted((row[0] for row in rows), key=int)
+
+    def same_card(self, a, b) -> bool:
+        card_id = self.card_id(a)
+        return str(a) == str(b) or (card_id is not None and card_id == self.card_id(b))
+
+    def __contains__(self, mvid) -> bool:
+        return self.card_id(mvid) is not None
+
+    def crawled(self, mvid) -> bool:
+        """Return whether the page of mvid has been read by crawl."""
+        row = self.conn.execute('SELECT crawled FROM printings WHERE mvid = ?', (str(mvid),)).fetchone()
+        return row is not None and bool(row[0])
+
+    def merge(self, printing_lists: Iterable[Iterable]) -> int:
+        """
+        Merge lists of mvids known to be printings of the same card into the index.
+
+        Existing classes touched by a list are merged along with it. Returns the number of
+        mvids whose card id was written.
+        """
+        classes = UnionFind()
+        for printing_list in printing_lists:
+            printing_list = [str(mvid) for mvid in printing_list]
+            for mvid in printing_list:
+                classes.union(printing_list[0], mvid)
+        for mvid in list(classes.parent):
+            for other in self.printings(mvid):
+                classes.union(mvid, other)
+        rows = []
+        for members in classes.groups().values():
+            card_id = min(int(mvid) for mvid in members)
+            rows += [(mvid, card_id) for mvid in members]
+        with self.conn:
+            self.conn.executemany('INSERT INTO printings (mvid, card_id) VALUES (?, ?) '
+                                  'ON CONFLICT (mvid) DO UPDATE SET card_id = excluded.card_id', rows)
+        return len(rows)
+
+    def crawl(self, seeds: Iterable, jobs: int = 8, rate: Optional[float] = None) -> int:
+        """
+        Index the transitive closure of the printings of seeds.
+
+        Every mvid is fetched at most once, in concurrent batches through gatherer.get_pages,
+        and mvids crawled by an earlier run are not fetched again. Returns the number of pages used.
+        """
+        seen = set()
+        frontier = {str(mvid) for mvid in seeds if not self.crawled(mvid)}
+        pages = 0
+        while frontier:
+            seen |= frontier
+            fetched = gatherer.get_pages(frontier, jobs, rate)
+            pages += len(fetched)
+            printing_lists = [[mvid] + [str(p) for p in gatherer.printings_from_page(mvid, page)]
+                              for mvid, page in fetched.items()]
+            self.merge(printing_lists)
+            with self.conn:
+                self.conn.executemany('UPDATE printings SET crawled = 1 WHERE mvid = ?',
+                                      [(mvid,) for mvid in fetched])
+            frontier = {mvid for printing_list in printing_lists for mvid in printing_list
+                        if mvid not in seen and not self.crawled(mvid)}
+        return pages
+
+
+def main(index: str, mvids: List[str], dec: Optional[str] = None, coll2: Optional[str] = None,
+         jobs: int = 8, rate: Optional[float] = None) -> int:
+    """Crawl the printings of the given mvids and the cards in the given files into the index."""
+    seeds = list(mvids)
+    if dec:
+        seeds += [mvid for mvid, _ in gatherer.iter_dec(dec, loc=None)]
+    if coll2:
+        seeds += [mvid for mvid, _ in gatherer.iter_coll2(coll2)]
+    pages = PrintingIndex(index).crawl(seeds, jobs, rate)
+    print(f"Indexed printings from {pages} pages")
+    return 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Build the index of which mvids are printings of the same card.")
+    parser.add_argument('mvids', nargs='*', help="Multiverse ids to crawl from.")
+    parser.add_argument('--dec', type=str, help="Also crawl from the cards in this dec file.")
+    parser.add_argument('--coll2', type=str, help="Also crawl from the cards in this coll2 file.")
+    parser.add_argument('--index', type=str, default=INDEX_FILE, help="The index file to update.")
+    parser.add_argument('--jobs', type=int, default=8, help="Concurrent page fetches.")
+    parser.add_argument('--rate', type=float, help="Maximum page fetches per second.")
+    sys.exit(main(**vars(parser.parse_args())))